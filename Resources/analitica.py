@@ -0,0 +1,144 @@
+from __future__ import annotations
+import csv
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import QDate
+from PyQt6.QtWidgets import (
+    QComboBox, QDateEdit, QDialog, QFileDialog, QHBoxLayout, QLabel, QMessageBox, QPushButton,
+    QTableWidget, QTableWidgetItem, QVBoxLayout
+)
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+from botones import make_big
+from metricas import medir, metricas
+from storage import load_config, ventas_por_producto
+from storage_worker import storage_worker
+from ventas_columnar import columnar_sales
+
+def iso_week_range(d:date)->tuple[date,date]:
+    monday=d-timedelta(days=d.weekday())
+    sunday=monday+timedelta(days=6)
+    return monday,sunday
+
+def annotate_bars(ax,bars):
+    for rect in bars:
+        h=rect.get_height()
+        ax.annotate(f"{int(h)}",xy=(rect.get_x()+rect.get_width()/2,h),xytext=(0,3),textcoords="offset points",ha="center",va="bottom",fontsize=9)
+
+class AnalyticsWindow(QDialog):
+    def __init__(self,parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Analítica de ventas por producto")
+        self.resize(1000,700)
+        self.columnar=columnar_sales() if load_config().get("analitica")=="numpy" else None
+        root=QVBoxLayout(self)
+        ctrl=QHBoxLayout()
+        self.mode=QComboBox(); self.mode.addItems(["General","Diario","Semanal"])
+        ctrl.addWidget(QLabel("Modo:")); ctrl.addWidget(self.mode)
+        self.date_pick=QDateEdit(); self.date_pick.setCalendarPopup(True); self.date_pick.setDate(QDate.currentDate())
+        ctrl.addWidget(QLabel("Fecha base:")); ctrl.addWidget(self.date_pick)
+        self.btn_calc=QPushButton("Calcular")
+        self.btn_export=QPushButton("Exportar CSV…")
+        for b in (self.btn_calc,self.btn_export): make_big(b)
+        ctrl.addStretch(); ctrl.addWidget(self.btn_calc); ctrl.addWidget(self.btn_export)
+        root.addLayout(ctrl)
+        self.table=QTableWidget(0,4)
+        self.table.setHorizontalHeaderLabels(["Producto","Cantidad","Importe","Tickets distintos"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        root.addWidget(self.table,3)
+        charts_row=QHBoxLayout()
+        self.fig_bar=Figure(figsize=(4,3),dpi=100); self.canvas_bar=FigureCanvas(self.fig_bar); charts_row.addWidget(self.canvas_bar,1)
+        self.fig_pie=Figure(figsize=(4,3),dpi=100); self.canvas_pie=FigureCanvas(self.fig_pie); charts_row.addWidget(self.canvas_pie,1)
+        root.addLayout(charts_row,4)
+        self.btn_calc.clicked.connect(self.compute)
+        self.btn_export.clicked.connect(self.export_csv)
+        self.mode.currentIndexChanged.connect(self.compute)
+        self.date_pick.dateChanged.connect(self.compute)
+        self.compute()
+
+    def _ventas(self,desde:Optional[date],hasta:Optional[date])->List[Tuple[str,int,float,int]]:
+        if self.columnar is not None:
+            with medir("analitica.columnar"): return self.columnar.query(desde,hasta)
+        return ventas_por_producto(desde,hasta)
+
+    def _title_suffix(self,mode:str,base_day:date)->str:
+        if mode=="Diario":
+            return base_day.strftime(" — %Y-%m-%d")
+        if mode=="Semanal":
+            start,end=iso_week_range(base_day)
+            return f" — Semana ISO ({start.strftime('%Y-%m-%d')} a {end.strftime('%Y-%m-%d')})"
+        return ""
+
+    def compute(self):
+        mode=self.mode.currentText()
+        base_qd=self.date_pick.date()
+        base_day=date(base_qd.year(),base_qd.month(),base_qd.day())
+        if mode=="Diario":
+            desde,hasta=base_day,base_day
+        elif mode=="Semanal":
+            desde,hasta=iso_week_range(base_day)
+        else:
+            desde,hasta=None,None
+        t0=time.perf_counter()
+        def mostrar(ventas:List[Tuple[str,int,float,int]]):
+            self._mostrar(mode,base_day,ventas); metricas().registrar_desde("ui.analitica",t0)
+        storage_worker().submit(self._ventas,desde,hasta,callback=mostrar,owner=self)
+
+    def _mostrar(self,mode:str,base_day:date,ventas:List[Tuple[str,int,float,int]]):
+        counts:Dict[str,int]={n:q for n,q,_,_ in ventas}
+        totals:Dict[str,float]={n:a for n,_,a,_ in ventas}
+        tickets_by_product:Dict[str,int]={n:t for n,_,_,t in ventas}
+        items_sorted=sorted(counts.items(),key=lambda kv:kv[1],reverse=True)
+        self.table.setRowCount(len(items_sorted))
+        for i,(name,qty) in enumerate(items_sorted):
+            self.table.setItem(i,0,QTableWidgetItem(name))
+            self.table.setItem(i,1,QTableWidgetItem(str(qty)))
+            self.table.setItem(i,2,QTableWidgetItem(f"${totals.get(name,0.0):.2f}"))
+            self.table.setItem(i,3,QTableWidgetItem(str(tickets_by_product.get(name,0))))
+        with medir("ui.analitica_graficas"):
+            self.fig_bar.clear()
+            axb=self.fig_bar.add_subplot(111)
+            axb.grid(axis="y",linestyle="--",alpha=0.4)
+            axb.set_axisbelow(True)
+            title_suf=self._title_suffix(mode,base_day)
+            axb.set_title("Top productos por cantidad"+title_suf)
+            if items_sorted:
+                labels=[n for n,_ in items_sorted[:12]]
+                values=[counts[n] for n in labels]
+                bars=axb.bar(range(len(labels)),values)
+                axb.set_xticks(range(len(labels)))
+                axb.set_xticklabels(labels,rotation=35,ha="right")
+                axb.set_ylabel("Cantidad")
+                annotate_bars(axb,bars)
+            else:
+                axb.text(0.5,0.5,"Sin datos",ha="center",va="center",transform=axb.transAxes)
+            self.fig_bar.tight_layout(); self.canvas_bar.draw(); self.canvas_bar.repaint()
+            self.fig_pie.clear()
+            axp=self.fig_pie.add_subplot(111)
+            axp.set_title("Distribución de ventas"+title_suf)
+            if items_sorted:
+                labels=[n for n,_ in items_sorted[:8]]
+                values=[counts[n] for n in labels]
+                axp.pie(values,labels=labels,autopct="%1.0f%%",startangle=90,wedgeprops={"width":0.45,"edgecolor":"white"})
+                axp.axis("equal")
+            else:
+                axp.text(0.5,0.5,"Sin datos",ha="center",va="center",transform=axb.transAxes)
+            self.fig_pie.tight_layout(); self.canvas_pie.draw(); self.canvas_pie.repaint()
+
+    def export_csv(self):
+        path,_=QFileDialog.getSaveFileName(self,"Exportar CSV","reporte_ventas.csv","CSV (*.csv)")
+        if not path: return
+        out=[]
+        for r in range(self.table.rowCount()):
+            out.append([
+                self.table.item(r,0).text() if self.table.item(r,0) else "",
+                self.table.item(r,1).text() if self.table.item(r,1) else "",
+                self.table.item(r,2).text() if self.table.item(r,2) else "",
+                self.table.item(r,3).text() if self.table.item(r,3) else "",
+            ])
+        with open(path,"w",newline="",encoding="utf-8") as f:
+            w=csv.writer(f); w.writerow(["Producto","Cantidad","Importe","Tickets distintos"]); w.writerows(out)
+        QMessageBox.information(self,"Exportado",f"Archivo guardado en {path}")
@@ -1,130 +1,36 @@
 from __future__ import annotations
-import csv
 import os
-import json
-from datetime import datetime, date, timedelta
-from typing import List, Tuple, Optional, Dict
+import threading
+import time
+from datetime import datetime, date
+from typing import List, Tuple, Optional, Dict, Set
 
-from PyQt6.QtCore import Qt, QTimer, QDate
-from PyQt6.QtGui import QAction, QPalette, QColor, QFont
+from PyQt6.QtCore import Qt, QTimer, QDate, QObject
+from PyQt6.QtGui import QAction, QPalette, QColor, QFont, QKeySequence
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-    QPushButton, QListWidget, QMessageBox, QComboBox, QScrollArea, QFrame,
-    QFileDialog, QGridLayout, QDateEdit, QSplitter, QTextEdit, QDialog,
-    QFormLayout, QTableWidget, QTableWidgetItem, QDoubleSpinBox
+    QPushButton, QListWidget, QListView, QMessageBox, QComboBox, QScrollArea, QFrame,
+    QFileDialog, QDateEdit, QSplitter, QTextEdit, QDialog,
+    QFormLayout, QDoubleSpinBox, QTableWidget, QTableWidgetItem
 )
 
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-
-CSV_FILE = "comandas_estado.csv"
-CAJA_FILE = "caja_movimientos.csv"
-CONFIG_FILE = "config_caja.json"
-
-PRODUCTS = {
-    "Torta de Carne Asada": 110.0,
-    "Torta de Cochinita Pibil": 90.0,
-    "Torta Mixta": 125.0,
-    "Tacos Carne Asada (5)": 110.0,
-    "Tacos Cochinita Pibil (5)": 110.0,
-    "Extra de Queso o Aguacate": 15.0,
-    "Chile Chilaca Relleno": 75.0,
-    "Cochichilaca": 110.0,
-    "Volcán de Cochinita": 90.0,
-    "Volcán de Carne Asada": 90.0,
-    "Volcán Mixto": 90.0,
-    "Tostada de Ceviche de Pescado": 45.0,
-    "Hazla Cochi": 20.0,
-}
-
-CSV_HEADER = [
-    "ID","Cliente","Número de Mesa","Productos","Total","Fecha y Hora","Estado","Comentarios",
-    "MetodoPago","EfectivoIngresado","TarjetaIngresado","Cambio","Restante"
-]
-
-CAJA_HEADER = [
-    "Timestamp","Tipo","OrderID","IngresoEfectivo","EgresoEfectivo","Nota","SaldoCaja"
-]
-
-def ensure_csv():
-    if not os.path.exists(CSV_FILE):
-        with open(CSV_FILE,"w",newline="",encoding="utf-8") as f:
-            csv.writer(f).writerow(CSV_HEADER)
-        return
-    with open(CSV_FILE,"r",newline="",encoding="utf-8") as f:
-        rows=list(csv.reader(f))
-    if not rows:
-        with open(CSV_FILE,"w",newline="",encoding="utf-8") as f:
-            csv.writer(f).writerow(CSV_HEADER)
-        return
-    changed=rows[0]!=CSV_HEADER
-    norm=[CSV_HEADER]
-    for r in rows[1:]:
-        if not r: continue
-        if len(r)<len(CSV_HEADER): r=r+[""]*(len(CSV_HEADER)-len(r))
-        elif len(r)>len(CSV_HEADER): r=r[:len(CSV_HEADER)]
-        norm.append(r)
-    if changed or len(norm)!=len(rows):
-        with open(CSV_FILE,"w",newline="",encoding="utf-8") as f:
-            csv.writer(f).writerows(norm)
-
-def ensure_caja():
-    if not os.path.exists(CAJA_FILE):
-        with open(CAJA_FILE,"w",newline="",encoding="utf-8") as f:
-            csv.writer(f).writerow(CAJA_HEADER)
-
-def caja_saldo_actual() -> float:
-    ensure_caja()
-    saldo=0.0
-    with open(CAJA_FILE,"r",newline="",encoding="utf-8") as f:
-        rows=list(csv.reader(f))
-        if len(rows)<=1: return 0.0
-        try: saldo=float(rows[-1][-1])
-        except: saldo=0.0
-    return saldo
-
-def apertura_existente(fecha_str:str) -> bool:
-    ensure_caja()
-    with open(CAJA_FILE,"r",newline="",encoding="utf-8") as f:
-        rows=list(csv.reader(f))
-    for r in rows[1:]:
-        try:
-            if r[1]=="FONDO_INICIAL" and r[0].split(" ")[0]==fecha_str:
-                return True
-        except:
-            pass
-    return False
-
-def caja_registrar(tipo:str, order_id:str, ingreso_ef:float, egreso_ef:float, nota:str):
-    ensure_caja()
-    saldo=caja_saldo_actual()+ingreso_ef-egreso_ef
-    with open(CAJA_FILE,"a",newline="",encoding="utf-8") as f:
-        w=csv.writer(f)
-        w.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"),tipo,order_id,f"{ingreso_ef:.2f}",f"{egreso_ef:.2f}",nota,f"{saldo:.2f}"])
-
-def read_orders()->List[List[str]]:
-    ensure_csv()
-    with open(CSV_FILE,"r",newline="",encoding="utf-8") as f:
-        return list(csv.reader(f))
-
-def write_orders(all_rows:List[List[str]]):
-    with open(CSV_FILE,"w",newline="",encoding="utf-8") as f:
-        csv.writer(f).writerows(all_rows)
-
-def next_order_id()->int:
-    rows=read_orders()
-    ids=[]
-    for r in rows[1:]:
-        try: ids.append(int(r[0]))
-        except: pass
-    return (max(ids)+1) if ids else 1
-
-def parse_dt(s:str)->datetime:
-    try: return datetime.strptime(s,"%Y-%m-%d %H:%M:%S")
-    except: return datetime.min
-
-def parse_products(items_str:str)->List[str]:
-    return [s.strip() for s in items_str.split(",") if s.strip()]
+from catalogo import PRODUCTS
+from botones import make_big, set_btn_font
+from storage_worker import storage_worker
+from cambios_pedidos import change_feed
+from metricas import METRICS_FILE, metricas, leer_historial
+from modelo_pedidos import ID_ROLE, FiltroEstado, PedidosModel, TableroPedidos
+from storage import (
+    CSV_FILE, ensure_storage, load_config, save_config, apertura_existente, caja_registrar, corte_dia, caja_verificar_saldo, archivar_cerrados,
+    orders_for_day, orders_version, get_order, set_order_status, guardar_pedido,
+    EV_CREATE, EV_UPDATE, EV_STATUS,
+    Order, LineItem, group_items, items_text, to_cents, cents_str
+)
+
+POLL_MS = 10_000
+POLL_FALLBACK_MS = 60_000
+PRELOAD_DELAY_MS = 3000
+METRICS_FLUSH_MS = 60_000
 
 def dark_palette(app:QApplication):
     pal=QPalette()
@@ -143,9 +49,9 @@ def light_palette(app:QApplication):
     app.setPalette(app.style().standardPalette())
 
 class TicketWindow(QMainWindow):
-    def __init__(self, row:List[str]):
+    def __init__(self, order:Order):
         super().__init__()
-        self.setWindowTitle(f"Ticket #{row[0]}")
+        self.setWindowTitle(f"Ticket #{order.id}")
         self.resize(520,680)
         central=QWidget(); self.setCentralWidget(central)
         root=QVBoxLayout(central)
@@ -153,150 +59,24 @@ class TicketWindow(QMainWindow):
         cont=QFrame(); cont.setObjectName("TicketCard")
         cont.setStyleSheet("QFrame#TicketCard { background: #111; border: 2px dashed #666; border-radius: 14px; } QLabel { color: #fff; }")
         v=QVBoxLayout(cont); v.setContentsMargins(18,18,18,18); v.setSpacing(10)
-        h_title=QLabel(f"PEDIDO #{row[0]}  •  MESA {row[2]}")
+        h_title=QLabel(f"PEDIDO #{order.id}  •  MESA {order.mesa}")
         f_title=QFont(); f_title.setPointSize(20); f_title.setBold(True); h_title.setFont(f_title)
-        cli=QLabel(f"Mesa: {row[2]}"); f_cli=QFont(); f_cli.setPointSize(18); cli.setFont(f_cli)
-        prods=QLabel("Productos:\n"+row[3]); prods.setWordWrap(True); f_p=QFont(); f_p.setPointSize(18); prods.setFont(f_p)
-        comentarios=QLabel("Comentarios: "+(row[7] if len(row)>7 and row[7].strip() else "(sin comentarios)"))
+        cli=QLabel(f"Mesa: {order.mesa}"); f_cli=QFont(); f_cli.setPointSize(18); cli.setFont(f_cli)
+        lineas="\n".join(f"{it.label()}   ${it.importe:.2f}" for it in order.items)
+        prods=QLabel("Productos:\n"+lineas); prods.setWordWrap(True); f_p=QFont(); f_p.setPointSize(18); prods.setFont(f_p)
+        comentarios=QLabel("Comentarios: "+(order.comentarios if order.comentarios.strip() else "(sin comentarios)"))
         comentarios.setWordWrap(True); comentarios.setFont(f_p)
-        total=QLabel(f"TOTAL: ${row[4]}"); f_tot=QFont(); f_tot.setPointSize(22); f_tot.setBold(True); total.setFont(f_tot)
-        foot=QLabel(f"{row[6]}  •  {row[5]}"); f_foot=QFont(); f_foot.setPointSize(16); foot.setFont(f_foot)
+        total=QLabel(f"TOTAL: ${cents_str(order.total)}"); f_tot=QFont(); f_tot.setPointSize(22); f_tot.setBold(True); total.setFont(f_tot)
+        foot=QLabel(f"{order.estado}  •  {order.ts}"); f_foot=QFont(); f_foot.setPointSize(16); foot.setFont(f_foot)
         v.addWidget(h_title); v.addWidget(cli); v.addWidget(prods); v.addWidget(comentarios); v.addWidget(total); v.addWidget(foot)
         root.addWidget(cont)
         btns=QHBoxLayout()
         btn_full=QPushButton("Pantalla completa"); btn_full.clicked.connect(self.showMaximized)
         btn_close=QPushButton("Cerrar"); btn_close.clicked.connect(self.close)
-        for b in (btn_full,btn_close): _make_big(b)
+        for b in (btn_full,btn_close): make_big(b)
         btns.addStretch(); btns.addWidget(btn_full); btns.addWidget(btn_close)
         root.addLayout(btns)
 
-def iso_week_range(d:date)->tuple[date,date]:
-    monday=d-timedelta(days=d.weekday())
-    sunday=monday+timedelta(days=6)
-    return monday,sunday
-
-def annotate_bars(ax,bars):
-    for rect in bars:
-        h=rect.get_height()
-        ax.annotate(f"{int(h)}",xy=(rect.get_x()+rect.get_width()/2,h),xytext=(0,3),textcoords="offset points",ha="center",va="bottom",fontsize=9)
-
-class AnalyticsWindow(QDialog):
-    def __init__(self,parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Analítica de ventas por producto")
-        self.resize(1000,700)
-        root=QVBoxLayout(self)
-        ctrl=QHBoxLayout()
-        self.mode=QComboBox(); self.mode.addItems(["General","Diario","Semanal"])
-        ctrl.addWidget(QLabel("Modo:")); ctrl.addWidget(self.mode)
-        self.date_pick=QDateEdit(); self.date_pick.setCalendarPopup(True); self.date_pick.setDate(QDate.currentDate())
-        ctrl.addWidget(QLabel("Fecha base:")); ctrl.addWidget(self.date_pick)
-        self.btn_calc=QPushButton("Calcular")
-        self.btn_export=QPushButton("Exportar CSV…")
-        for b in (self.btn_calc,self.btn_export): _make_big(b)
-        ctrl.addStretch(); ctrl.addWidget(self.btn_calc); ctrl.addWidget(self.btn_export)
-        root.addLayout(ctrl)
-        self.table=QTableWidget(0,4)
-        self.table.setHorizontalHeaderLabels(["Producto","Cantidad","Importe","Tickets distintos"])
-        self.table.horizontalHeader().setStretchLastSection(True)
-        root.addWidget(self.table,3)
-        charts_row=QHBoxLayout()
-        self.fig_bar=Figure(figsize=(4,3),dpi=100); self.canvas_bar=FigureCanvas(self.fig_bar); charts_row.addWidget(self.canvas_bar,1)
-        self.fig_pie=Figure(figsize=(4,3),dpi=100); self.canvas_pie=FigureCanvas(self.fig_pie); charts_row.addWidget(self.canvas_pie,1)
-        root.addLayout(charts_row,4)
-        self.btn_calc.clicked.connect(self.compute)
-        self.btn_export.clicked.connect(self.export_csv)
-        self.mode.currentIndexChanged.connect(self.compute)
-        self.date_pick.dateChanged.connect(self.compute)
-        self.compute()
-
-    def _in_day(self,dt:datetime,day:date)->bool:
-        return dt.date()==day
-
-    def _in_iso_week(self,dt:datetime,base_day:date)->bool:
-        y1,w1,_=dt.date().isocalendar()
-        y2,w2,_=base_day.isocalendar()
-        return (y1,w1)==(y2,w2)
-
-    def _title_suffix(self,mode:str,base_day:date)->str:
-        if mode=="Diario":
-            return base_day.strftime(" — %Y-%m-%d")
-        if mode=="Semanal":
-            start,end=iso_week_range(base_day)
-            return f" — Semana ISO ({start.strftime('%Y-%m-%d')} a {end.strftime('%Y-%m-%d')})"
-        return ""
-
-    def compute(self):
-        rows=read_orders()
-        data=rows[1:]
-        mode=self.mode.currentText()
-        base_qd=self.date_pick.date()
-        base_day=date(base_qd.year(),base_qd.month(),base_qd.day())
-        counts:Dict[str,int]={}
-        totals:Dict[str,float]={}
-        tickets_by_product:Dict[str,set]={}
-        for r in data:
-            dt=parse_dt(r[5])
-            if mode=="Diario" and not self._in_day(dt,base_day): continue
-            if mode=="Semanal" and not self._in_iso_week(dt,base_day): continue
-            items=parse_products(r[3])
-            ticket_id=r[0]
-            for it in items:
-                counts[it]=counts.get(it,0)+1
-                price=PRODUCTS.get(it,0.0)
-                totals[it]=totals.get(it,0.0)+(price or 0.0)
-                tickets_by_product.setdefault(it,set()).add(ticket_id)
-        items_sorted=sorted(counts.items(),key=lambda kv:kv[1],reverse=True)
-        self.table.setRowCount(len(items_sorted))
-        for i,(name,qty) in enumerate(items_sorted):
-            self.table.setItem(i,0,QTableWidgetItem(name))
-            self.table.setItem(i,1,QTableWidgetItem(str(qty)))
-            self.table.setItem(i,2,QTableWidgetItem(f"${totals.get(name,0.0):.2f}"))
-            self.table.setItem(i,3,QTableWidgetItem(str(len(tickets_by_product.get(name,set())))))
-        self.fig_bar.clear()
-        axb=self.fig_bar.add_subplot(111)
-        axb.grid(axis="y",linestyle="--",alpha=0.4)
-        axb.set_axisbelow(True)
-        title_suf=self._title_suffix(mode,base_day)
-        axb.set_title("Top productos por cantidad"+title_suf)
-        if items_sorted:
-            labels=[n for n,_ in items_sorted[:12]]
-            values=[counts[n] for n in labels]
-            bars=axb.bar(range(len(labels)),values)
-            axb.set_xticks(range(len(labels)))
-            axb.set_xticklabels(labels,rotation=35,ha="right")
-            axb.set_ylabel("Cantidad")
-            annotate_bars(axb,bars)
-        else:
-            axb.text(0.5,0.5,"Sin datos",ha="center",va="center",transform=axb.transAxes)
-        self.fig_bar.tight_layout(); self.canvas_bar.draw(); self.canvas_bar.repaint()
-        self.fig_pie.clear()
-        axp=self.fig_pie.add_subplot(111)
-        axp.set_title("Distribución de ventas"+title_suf)
-        if items_sorted:
-            labels=[n for n,_ in items_sorted[:8]]
-            values=[counts[n] for n in labels]
-            axp.pie(values,labels=labels,autopct="%1.0f%%",startangle=90,wedgeprops={"width":0.45,"edgecolor":"white"})
-            axp.axis("equal")
-        else:
-            axp.text(0.5,0.5,"Sin datos",ha="center",va="center",transform=axb.transAxes)
-        self.fig_pie.tight_layout(); self.canvas_pie.draw(); self.canvas_pie.repaint()
-
-    def export_csv(self):
-        path,_=QFileDialog.getSaveFileName(self,"Exportar CSV","reporte_ventas.csv","CSV (*.csv)")
-        if not path: return
-        out=[]
-        for r in range(self.table.rowCount()):
-            out.append([
-                self.table.item(r,0).text() if self.table.item(r,0) else "",
-                self.table.item(r,1).text() if self.table.item(r,1) else "",
-                self.table.item(r,2).text() if self.table.item(r,2) else "",
-                self.table.item(r,3).text() if self.table.item(r,3) else "",
-            ])
-        with open(path,"w",newline="",encoding="utf-8") as f:
-            w=csv.writer(f); w.writerow(["Producto","Cantidad","Importe","Tickets distintos"]); w.writerows(out)
-        QMessageBox.information(self,"Exportado",f"Archivo guardado en {path}")
-
 class PaymentDialog(QDialog):
     def __init__(self,total:float,parent=None,preset:Optional[Dict[str,float|str]]=None):
         super().__init__(parent)
@@ -326,7 +106,7 @@ class PaymentDialog(QDialog):
         btns=QHBoxLayout()
         self.btn_ok=QPushButton("Aceptar")
         self.btn_cancel=QPushButton("Cancelar")
-        for b in (self.btn_ok,self.btn_cancel): _make_big(b)
+        for b in (self.btn_ok,self.btn_cancel): make_big(b)
         btns.addStretch(); btns.addWidget(self.btn_ok); btns.addWidget(self.btn_cancel)
         root.addLayout(btns)
         self.cmb_method.currentIndexChanged.connect(self.on_method_change)
@@ -414,7 +194,7 @@ class AjusteDialog(QDialog):
         root.addLayout(form)
         btns=QHBoxLayout()
         okb=QPushButton("Aceptar"); cb=QPushButton("Cancelar")
-        for b in (okb,cb): _make_big(b)
+        for b in (okb,cb): make_big(b)
         btns.addStretch(); btns.addWidget(okb); btns.addWidget(cb)
         root.addLayout(btns)
         self.cmb_accion.currentIndexChanged.connect(self._mode)
@@ -465,7 +245,7 @@ class CorteDialog(QDialog):
         form.addRow("Devolución en tarjeta:",self.dev_tj_lbl)
         form.addRow("Saldo final del día (caja):",self.saldo_lbl)
         root.addLayout(form)
-        btn=QPushButton("Cerrar"); _make_big(btn)
+        btn=QPushButton("Cerrar"); make_big(btn)
         root.addWidget(btn,alignment=Qt.AlignmentFlag.AlignRight)
         self.date.dateChanged.connect(self.recalc)
         btn.clicked.connect(self.accept)
@@ -474,115 +254,18 @@ class CorteDialog(QDialog):
     def recalc(self):
         d=self.date.date()
         d_str=f"{d.year():04d}-{d.month():02d}-{d.day():02d}"
-        fondo=self._fondo_dia(d_str)
-        efectivo=self._ventas_efectivo_dia(d_str)
-        tarjeta=self._ventas_tarjeta_dia(d_str)
-        dev_ef,dev_tj=self._devoluciones_dia(d_str)
-        saldo=self._saldo_final_dia(d_str)
-        self.fondo_lbl.setText(f"$ {fondo:,.2f}")
-        self.efectivo_lbl.setText(f"$ {efectivo:,.2f}")
-        self.tarjeta_lbl.setText(f"$ {tarjeta:,.2f}")
-        self.dev_ef_lbl.setText(f"$ {dev_ef:,.2f}")
-        self.dev_tj_lbl.setText(f"$ {dev_tj:,.2f}")
-        self.saldo_lbl.setText(f"$ {saldo:,.2f}")
-
-    def _fondo_dia(self,fecha:str)->float:
-        ensure_caja()
-        with open(CAJA_FILE,"r",newline="",encoding="utf-8") as f:
-            rows=list(csv.reader(f))
-        for r in rows[1:]:
-            try:
-                if r[1]=="FONDO_INICIAL" and r[0].split(" ")[0]==fecha:
-                    return float(r[3])
-            except: pass
-        return 0.0
-
-    def _ventas_efectivo_dia(self,fecha:str)->float:
-        rows=read_orders()
-        total=0.0
-        for r in rows[1:]:
-            try:
-                if r[5].split(" ")[0]==fecha:
-                    ef=float(r[9] or 0.0); cam=float(r[11] or 0.0)
-                    total+=max(ef-cam,0.0)
-            except: pass
-        return round(total,2)
-
-    def _ventas_tarjeta_dia(self,fecha:str)->float:
-        rows=read_orders()
-        total=0.0
-        for r in rows[1:]:
-            try:
-                if r[5].split(" ")[0]==fecha:
-                    tj=float(r[10] or 0.0)
-                    total+=tj
-            except: pass
-        return round(total,2)
-
-    def _devoluciones_dia(self,fecha:str)->Tuple[float,float]:
-        ensure_caja()
-        dev_ef=0.0; dev_tj=0.0
-        with open(CAJA_FILE,"r",newline="",encoding="utf-8") as f:
-            rows=list(csv.reader(f))
-        for r in rows[1:]:
-            try:
-                if r[0].split(" ")[0]==fecha:
-                    tipo=r[1]
-                    eg=float(r[4] or 0.0)
-                    if "DEVOLUCION" in tipo and "TARJETA" not in tipo:
-                        dev_ef+=eg
-                    if "DEVOLUCION_TARJETA" in tipo:
-                        nota=r[5] or ""
-                        if "TJ=" in nota:
-                            try:
-                                dev_tj+=float(nota.split("TJ=")[1].split()[0])
-                            except:
-                                pass
-            except: pass
-        return round(dev_ef,2),round(dev_tj,2)
-
-    def _saldo_final_dia(self,fecha:str)->float:
-        ensure_caja()
-        ingreso=0.0; egreso=0.0
-        with open(CAJA_FILE,"r",newline="",encoding="utf-8") as f:
-            rows=list(csv.reader(f))
-        for r in rows[1:]:
-            try:
-                if r[0].split(" ")[0]==fecha:
-                    ingreso+=float(r[3] or 0.0)
-                    egreso+=float(r[4] or 0.0)
-            except: pass
-        return round(ingreso-egreso,2)
-
-class OrderCard(QFrame):
-    def __init__(self,row:List[str],on_mark_delivered,on_view_ticket):
-        super().__init__()
-        self.setObjectName("OrderCard")
-        self.setFrameShape(QFrame.Shape.Box)
-        self.setStyleSheet("QFrame#OrderCard { background-color: #222; border: 2px solid #444; border-radius: 16px; } QLabel { color: #fff; } QPushButton { padding: 12px 16px; border-radius: 12px; background: #2e7d32; color: white; font-weight: 600; font-size: 14px;} QPushButton#Secondary { background: #616161; }")
-        layout=QVBoxLayout(self); layout.setContentsMargins(16,16,16,16); layout.setSpacing(10)
-        title_font=QFont(); title_font.setPointSize(18); title_font.setBold(True)
-        body_font=QFont(); body_font.setPointSize(16)
-        small_font=QFont(); small_font.setPointSize(14)
-        top=QLabel(f"ID #{row[0]}  |  Mesa {row[2]}"); top.setFont(title_font)
-        cliente=QLabel(f"Mesa: {row[2]}"); cliente.setFont(body_font)
-        prods=QLabel(f"Productos:\n{row[3]}"); prods.setWordWrap(True); prods.setFont(body_font)
-        prods.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        comentarios=QLabel(f"Comentarios: {(row[7] if len(row)>7 and row[7].strip() else '(sin comentarios)')}"); comentarios.setWordWrap(True); comentarios.setFont(body_font)
-        pago_info=""
-        if len(row)>=13:
-            pago_info=f"Método: {row[8] or '-'} • Efectivo: ${row[9] or '0'} • Tarjeta: ${row[10] or '0'} • Cambio: ${row[11] or '0'} • Restante: ${row[12] or '0'}"
-        footer=QLabel(f"Total: ${row[4]}   •   {row[6]}   •   {row[5]}"); footer.setFont(small_font)
-        pago_lbl=QLabel(pago_info); pago_lbl.setFont(small_font)
-        btns=QHBoxLayout()
-        deliver_btn=QPushButton("Entregado"); _make_big(deliver_btn); deliver_btn.clicked.connect(lambda: on_mark_delivered(int(row[0])))
-        ticket_btn=QPushButton("Ticket"); _make_big(ticket_btn); ticket_btn.setObjectName("Secondary"); ticket_btn.clicked.connect(lambda: on_view_ticket(row))
-        copy_btn=QPushButton("Copiar"); _make_big(copy_btn); copy_btn.setObjectName("Secondary"); copy_btn.clicked.connect(lambda: QApplication.clipboard().setText(row[3]))
-        layout.addWidget(top); layout.addWidget(cliente); layout.addWidget(prods); layout.addWidget(comentarios)
-        if pago_info: layout.addWidget(pago_lbl)
-        layout.addWidget(footer)
-        for b in (deliver_btn, ticket_btn, copy_btn): btns.addWidget(b)
-        layout.addLayout(btns)
+        t0=time.perf_counter()
+        def mostrar(corte:Dict[str,float]):
+            self._show(corte); metricas().registrar_desde("ui.corte",t0)
+        storage_worker().submit(corte_dia,d_str,callback=mostrar,owner=self)
+
+    def _show(self,corte:Dict[str,float]):
+        self.fondo_lbl.setText(f"$ {corte['fondo']:,.2f}")
+        self.efectivo_lbl.setText(f"$ {corte['efectivo']:,.2f}")
+        self.tarjeta_lbl.setText(f"$ {corte['tarjeta']:,.2f}")
+        self.dev_ef_lbl.setText(f"$ {corte['dev_efectivo']:,.2f}")
+        self.dev_tj_lbl.setText(f"$ {corte['dev_tarjeta']:,.2f}")
+        self.saldo_lbl.setText(f"$ {corte['saldo']:,.2f}")
 
 class KitchenWindow(QMainWindow):
     def __init__(self):
@@ -600,68 +283,70 @@ class KitchenWindow(QMainWindow):
         ctrl_row.addWidget(self.filter_combo)
         self.columns_combo=QComboBox(); self.columns_combo.addItems(["2 columnas","3 columnas"])
         ctrl_row.addWidget(self.columns_combo)
-        self.refresh_btn=QPushButton("Refrescar"); _make_big(self.refresh_btn); ctrl_row.addWidget(self.refresh_btn); ctrl_row.addStretch()
-        self.scroll=QScrollArea(); self.scroll.setWidgetResizable(True); root.addWidget(self.scroll)
-        self.grid_host=QWidget(); self.scroll.setWidget(self.grid_host)
-        self.grid=QGridLayout(self.grid_host); self.grid.setContentsMargins(4,4,4,4)
-        self.grid.setHorizontalSpacing(12); self.grid.setVerticalSpacing(12)
+        self.refresh_btn=QPushButton("Refrescar"); make_big(self.refresh_btn); ctrl_row.addWidget(self.refresh_btn); ctrl_row.addStretch()
+        self.model=PedidosModel(self)
+        self.board=TableroPedidos(self.model); root.addWidget(self.board)
+        self.board.delegate.entregado.connect(self.mark_delivered)
+        self.board.delegate.ticket.connect(self.open_ticket)
+        self.board.delegate.copiar.connect(lambda o: QApplication.clipboard().setText(items_text(o.items)))
         self.refresh_btn.clicked.connect(self.refresh)
         self.filter_combo.currentIndexChanged.connect(self.refresh)
         self.columns_combo.currentIndexChanged.connect(self.refresh)
         self.date_picker.dateChanged.connect(self.refresh)
-        self.timer=QTimer(self); self.timer.setInterval(10_000)
-        self.timer.timeout.connect(self.refresh); self.timer.start()
+        self._last_key:Optional[tuple]=None
+        # Los cambios llegan por el canal de avisos; el sondeo queda solo como respaldo.
+        self.timer=QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self._aviso=QTimer(self); self._aviso.setSingleShot(True); self._aviso.setInterval(30)
+        self._aviso.timeout.connect(self.refresh)
+        # El canal vive todo el proceso: con métodos propios (no lambdas) no retiene la ventana al reemplazarla.
+        feed=change_feed()
+        feed.cambio.connect(self._avisado)
+        feed.conexion.connect(self._ajustar_sondeo)
+        self._ajustar_sondeo(feed.conectado)
         self.refresh()
 
+    def _avisado(self,tipo:str,order_id:int):
+        self._aviso.start()
+
+    def _ajustar_sondeo(self,conectado:bool):
+        self.timer.start(POLL_FALLBACK_MS if conectado else POLL_MS)
+
     def current_columns(self)->int:
         return 3 if self.columns_combo.currentIndex()==1 else 2
 
-    def clear_grid(self):
-        while self.grid.count():
-            it=self.grid.takeAt(0)
-            w=it.widget()
-            if w:
-                w.setParent(None); w.deleteLater()
-
     def refresh(self):
-        rows=read_orders()
-        data=rows[1:]
-        data.sort(key=lambda r: parse_dt(r[5]))
         qd=self.date_picker.date()
         selected_day=date(qd.year(),qd.month(),qd.day())
-        data=[r for r in data if parse_dt(r[5]).date()==selected_day]
         st=self.filter_combo.currentText()
-        if st!="Todos":
-            data=[r for r in data if r[6]==st]
-        self.clear_grid()
         cols=self.current_columns()
-        ri=ci=0
-        for r in data:
-            card=OrderCard(r,self.mark_delivered,self.open_ticket)
-            card.setMinimumSize(360,260)
-            self.grid.addWidget(card,ri,ci)
-            ci+=1
-            if ci>=cols:
-                ci=0; ri+=1
-        if not data:
-            lbl=QLabel("Sin pedidos para mostrar en ese día.")
-            f=QFont(); f.setPointSize(18); f.setBold(True)
-            lbl.setFont(f); lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.grid.addWidget(lbl,0,0,1,cols)
+        last_key=self._last_key
+        t0=time.perf_counter()
+        def fetch():
+            key=(orders_version(),selected_day,st,cols)
+            if key==last_key: return key,None
+            return key,orders_for_day(selected_day,None if st=="Todos" else st)
+        def aplicar(result):
+            self._apply(result); metricas().registrar_desde("ui.cocina_refresco",t0)
+        storage_worker().submit(fetch,callback=aplicar,owner=self)
+
+    def _apply(self,result:Tuple[tuple,Optional[List[Order]]]):
+        key,data=result
+        if data is None or key==self._last_key: return
+        self._last_key=key
+        self.board.set_columnas(key[3])
+        self.model.actualizar(data)
 
     def mark_delivered(self,order_id:int):
-        rows=read_orders()
-        for i,r in enumerate(rows):
-            if i==0: continue
-            try:
-                if int(r[0])==order_id:
-                    rows[i][6]="Entregado"; break
-            except: pass
-        write_orders(rows); self.refresh()
-        QMessageBox.information(self,"OK",f"Pedido {order_id} marcado como Entregado.")
-
-    def open_ticket(self,row:List[str]):
-        win=TicketWindow(row)
+        t0=time.perf_counter()
+        def done(_):
+            metricas().registrar_desde("ui.cambio_estado",t0)
+            self.refresh(); change_feed().publish(EV_STATUS,order_id)
+            QMessageBox.information(self,"OK",f"Pedido {order_id} marcado como Entregado.")
+        storage_worker().submit(set_order_status,order_id,"Entregado",callback=done,owner=self)
+
+    def open_ticket(self,order:Order):
+        win=TicketWindow(order)
         win.showMaximized()
         self._ticket_win=win
 
@@ -677,7 +362,7 @@ class FondoCajaDialog(QDialog):
         root.addLayout(form)
         btns=QHBoxLayout()
         ok=QPushButton("Guardar"); ca=QPushButton("Cancelar")
-        for b in (ok,ca): _make_big(b)
+        for b in (ok,ca): make_big(b)
         btns.addStretch(); btns.addWidget(ok); btns.addWidget(ca)
         root.addLayout(btns)
         ok.clicked.connect(self.accept); ca.clicked.connect(self.reject)
@@ -685,13 +370,82 @@ class FondoCajaDialog(QDialog):
     def valor(self)->float:
         return float(self.spn.value())
 
+class DiagnosticoDialog(QDialog):
+    COLUMNAS=["Operación","N","p50 ms","p95 ms","Máx ms","Media ms","Filas","Bytes","Errores"]
+    CLAVES=["n","p50_ms","p95_ms","max_ms","media_ms","filas","bytes","errores"]
+
+    def __init__(self,parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnóstico")
+        self.resize(960,560)
+        root=QVBoxLayout(self)
+        row=QHBoxLayout()
+        row.addWidget(QLabel("Periodo:"))
+        self.periodo=QComboBox(); self.periodo.setMinimumWidth(280); row.addWidget(self.periodo)
+        row.addStretch()
+        self.info=QLabel(); row.addWidget(self.info)
+        root.addLayout(row)
+        self.table=QTableWidget(0,len(self.COLUMNAS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setSortingEnabled(True)
+        root.addWidget(self.table,1)
+        btns=QHBoxLayout()
+        upd=QPushButton("Actualizar"); save=QPushButton("Guardar ahora"); reset=QPushButton("Reiniciar"); close=QPushButton("Cerrar")
+        for b in (upd,save,reset,close): make_big(b); btns.addWidget(b)
+        btns.insertStretch(0)
+        root.addLayout(btns)
+        upd.clicked.connect(self.actualizar)
+        save.clicked.connect(self.guardar)
+        reset.clicked.connect(self.reiniciar)
+        close.clicked.connect(self.accept)
+        self.periodo.currentIndexChanged.connect(self._mostrar)
+        self._historial:List[Dict]=[]
+        self.actualizar()
+
+    def actualizar(self):
+        # Los intervalos guardados en el archivo, del más reciente al más antiguo.
+        self._historial=leer_historial()[::-1]
+        self.periodo.blockSignals(True)
+        self.periodo.clear(); self.periodo.addItem("Sesión actual")
+        for h in self._historial:
+            self.periodo.addItem(f"Intervalo hasta {h.get('fecha','?')} (pid {h.get('pid','-')})")
+        self.periodo.blockSignals(False)
+        self._mostrar()
+
+    def guardar(self):
+        metricas().volcar(); self.actualizar()
+
+    def reiniciar(self):
+        metricas().reiniciar(); self._mostrar()
+
+    def _mostrar(self):
+        i=self.periodo.currentIndex()
+        if i<=0:
+            ops=metricas().resumen()
+            self.info.setText(f"Desde {datetime.fromtimestamp(metricas().inicio):%Y-%m-%d %H:%M:%S}  •  {METRICS_FILE}")
+        else:
+            ops=self._historial[i-1].get("ops",{})
+            self.info.setText(f"Archivo: {METRICS_FILE}")
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(ops))
+        for r,(nombre,st) in enumerate(ops.items()):
+            self.table.setItem(r,0,QTableWidgetItem(nombre))
+            for c,k in enumerate(self.CLAVES,start=1):
+                # El valor numérico permite ordenar las columnas por tiempo.
+                it=QTableWidgetItem(); it.setData(Qt.ItemDataRole.DisplayRole,st.get(k,0))
+                self.table.setItem(r,c,it)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(3,Qt.SortOrder.DescendingOrder)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Sistema de Comandas con Gestión de Pedidos - PyQt6")
         self.resize(1300,800)
-        self.current_order:List[Tuple[str,float]]=[]
+        self.current_order:List[LineItem]=[]
         self.current_order_id:Optional[int]=None
+        self.current_version:Optional[int]=None
         self.current_payment:Dict[str,str]={}
         self.is_dark=True
         self._init_caja()
@@ -703,12 +457,19 @@ class MainWindow(QMainWindow):
         analytics_action.triggered.connect(self.open_analytics)
         corte_action=QAction("Corte del día",self)
         corte_action.triggered.connect(self.abrir_corte)
+        verificar_action=QAction("Verificar saldo de caja",self)
+        verificar_action.triggered.connect(self.verificar_caja)
+        archivar_action=QAction("Archivar días cerrados",self)
+        archivar_action.triggered.connect(self.archivar_dias)
         theme_action=QAction("Cambiar a modo claro",self)
         theme_action.triggered.connect(self.toggle_theme)
         menu=self.menuBar().addMenu("Ventanas"); menu.addAction(kitchen_action)
-        tools=self.menuBar().addMenu("Herramientas"); tools.addAction(open_csv_action); tools.addAction(analytics_action); tools.addAction(corte_action)
+        tools=self.menuBar().addMenu("Herramientas"); tools.addAction(open_csv_action); tools.addAction(analytics_action); tools.addAction(corte_action); tools.addAction(verificar_action); tools.addAction(archivar_action)
         appearance=self.menuBar().addMenu("Apariencia"); appearance.addAction(theme_action)
         self.theme_action=theme_action
+        # Sin entrada de menú: solo con el atajo, para revisar tiempos cuando reportan lentitud.
+        diag_action=QAction("Diagnóstico",self); diag_action.setShortcut(QKeySequence("Ctrl+Shift+D"))
+        diag_action.triggered.connect(self.abrir_diagnostico); self.addAction(diag_action)
         central=QWidget(); self.setCentralWidget(central)
         root=QHBoxLayout(central)
         left=QVBoxLayout(); root.addLayout(left,1)
@@ -723,20 +484,20 @@ class MainWindow(QMainWindow):
         for name,price in PRODUCTS.items():
             btn=QPushButton(f"{name} - ${price:.2f}")
             btn.clicked.connect(lambda _,n=name,p=price:self.add_product(n,p))
-            btn.setMinimumHeight(44); _set_btn_font(btn,14)
+            btn.setMinimumHeight(44); set_btn_font(btn,14)
             prod_layout.addWidget(btn)
         prod_layout.addStretch()
         right=QVBoxLayout(); root.addLayout(right,1)
         right.addWidget(QLabel("Productos en la Comanda:"))
         self.order_list=QListWidget(); self.order_list.setMinimumHeight(260); right.addWidget(self.order_list)
-        del_btn=QPushButton("Eliminar Producto Seleccionado"); _make_big(del_btn); del_btn.clicked.connect(self.remove_selected_product); right.addWidget(del_btn)
-        pay_btn=QPushButton("Cobrar / Método de pago"); _make_big(pay_btn); pay_btn.clicked.connect(self.set_payment_and_save); right.addWidget(pay_btn)
-        save_btn=QPushButton("Actualizar Comanda"); _make_big(save_btn); save_btn.clicked.connect(self.update_order_after_change); right.addWidget(save_btn)
-        clear_btn=QPushButton("Limpiar Lista"); _make_big(clear_btn); clear_btn.clicked.connect(self.clear_order); right.addWidget(clear_btn)
+        del_btn=QPushButton("Eliminar Producto Seleccionado"); make_big(del_btn); del_btn.clicked.connect(self.remove_selected_product); right.addWidget(del_btn)
+        pay_btn=QPushButton("Cobrar / Método de pago"); make_big(pay_btn); pay_btn.clicked.connect(self.set_payment_and_save); right.addWidget(pay_btn)
+        save_btn=QPushButton("Actualizar Comanda"); make_big(save_btn); save_btn.clicked.connect(self.update_order_after_change); right.addWidget(save_btn)
+        clear_btn=QPushButton("Limpiar Lista"); make_big(clear_btn); clear_btn.clicked.connect(self.clear_order); right.addWidget(clear_btn)
         bottom=QHBoxLayout(); right.addLayout(bottom)
         bottom.addWidget(QLabel("Cargar por ID:"))
         self.ticket_edit=QLineEdit(); bottom.addWidget(self.ticket_edit)
-        load_btn=QPushButton("Cargar Pedido"); _make_big(load_btn); load_btn.clicked.connect(self.load_order); bottom.addWidget(load_btn)
+        load_btn=QPushButton("Cargar Pedido"); make_big(load_btn); load_btn.clicked.connect(self.load_order); bottom.addWidget(load_btn)
         manage_box=QVBoxLayout(); root.addLayout(manage_box,1)
         header_row=QHBoxLayout(); manage_box.addLayout(header_row)
         header_row.addWidget(QLabel("Gestión de Pedidos por día:")); header_row.addStretch()
@@ -748,22 +509,29 @@ class MainWindow(QMainWindow):
         pending_panel=QWidget(); pending_layout=QVBoxLayout(pending_panel)
         lbl_pend=QLabel("Pendientes"); f1=QFont(); f1.setPointSize(12); f1.setBold(True); lbl_pend.setFont(f1)
         pending_layout.addWidget(lbl_pend)
-        self.manage_list_pending=QListWidget(); pending_layout.addWidget(self.manage_list_pending,1)
+        self.pedidos=PedidosModel(self)
+        self.manage_list_pending=self._lista_pedidos(False); pending_layout.addWidget(self.manage_list_pending,1)
         splitter.addWidget(pending_panel)
         delivered_panel=QWidget(); delivered_layout=QVBoxLayout(delivered_panel)
         lbl_ent=QLabel("Entregados"); f2=QFont(); f2.setPointSize(12); f2.setBold(True); lbl_ent.setFont(f2)
         delivered_layout.addWidget(lbl_ent)
-        self.manage_list_delivered=QListWidget(); delivered_layout.addWidget(self.manage_list_delivered,1)
+        self.manage_list_delivered=self._lista_pedidos(True); delivered_layout.addWidget(self.manage_list_delivered,1)
         splitter.addWidget(delivered_panel)
         actions_row=QHBoxLayout(); manage_box.addLayout(actions_row)
-        mark_delivered=QPushButton("Marcar como Entregado"); _make_big(mark_delivered); mark_delivered.clicked.connect(lambda: self.change_order_status("Entregado"))
+        mark_delivered=QPushButton("Marcar como Entregado"); make_big(mark_delivered); mark_delivered.clicked.connect(lambda: self.change_order_status("Entregado"))
         actions_row.addWidget(mark_delivered)
-        mark_pending=QPushButton("Marcar como Pendiente"); _make_big(mark_pending); mark_pending.clicked.connect(lambda: self.change_order_status("Pendiente"))
+        mark_pending=QPushButton("Marcar como Pendiente"); make_big(mark_pending); mark_pending.clicked.connect(lambda: self.change_order_status("Pendiente"))
         actions_row.addWidget(mark_pending)
         actions_row.addStretch()
-        self.manage_list_pending.itemDoubleClicked.connect(lambda *_: None)
-        self.manage_list_delivered.itemDoubleClicked.connect(lambda *_: None)
+        # Seleccionar en una lista quita la selección de la otra: la acción aplica a un solo pedido.
+        for a,b in ((self.manage_list_pending,self.manage_list_delivered),(self.manage_list_delivered,self.manage_list_pending)):
+            a.selectionModel().selectionChanged.connect(lambda sel,_,otra=b: otra.clearSelection() if sel.indexes() else None)
         self.date_picker.dateChanged.connect(self.load_all_orders_for_day)
+        # Cada aviso (guardado propio o de otra estación) relee solo los pedidos avisados.
+        self._avisados:Set[int]=set()
+        self._aviso=QTimer(self); self._aviso.setSingleShot(True); self._aviso.setInterval(30)
+        self._aviso.timeout.connect(self._aplicar_avisos)
+        change_feed().cambio.connect(self._avisado)
         self.load_all_orders_for_day()
         self.update_order_display()
 
@@ -781,30 +549,41 @@ class MainWindow(QMainWindow):
             app.setStyleSheet("QPushButton{min-height:40px; font-size:14px;}")
 
     def _init_caja(self):
-        ensure_caja()
         hoy=datetime.now().strftime("%Y-%m-%d")
-        ya_apertura=apertura_existente(hoy)
-        cfg={}
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE,"r",encoding="utf-8") as f:
-                    cfg=json.load(f)
-            except:
-                cfg={}
+        ya_apertura=storage_worker().call(apertura_existente,hoy)
+        cfg=load_config()
         if cfg.get("fecha")==hoy and ya_apertura:
             return
         if not ya_apertura:
             dlg=FondoCajaDialog(self)
             if dlg.exec()==QDialog.DialogCode.Accepted:
                 fondo=dlg.valor()
-                caja_registrar("FONDO_INICIAL","-",fondo,0.0,"Fondo apertura")
-                with open(CONFIG_FILE,"w",encoding="utf-8") as g:
-                    json.dump({"fecha":hoy,"fondo":fondo},g)
+                storage_worker().call(caja_registrar,"FONDO_INICIAL","-",fondo,0.0,"Fondo apertura")
+                cfg.update({"fecha":hoy,"fondo":fondo}); save_config(cfg)
 
     def abrir_corte(self):
         dlg=CorteDialog(self)
         dlg.exec()
 
+    def abrir_diagnostico(self):
+        dlg=DiagnosticoDialog(self)
+        dlg.exec()
+
+    def archivar_dias(self):
+        if QMessageBox.question(self,"Archivar","Mover los días cerrados de periodos anteriores al archivo comprimido?")!=QMessageBox.StandardButton.Yes:
+            return
+        storage_worker().submit(archivar_cerrados,callback=lambda n: QMessageBox.information(self,"Archivar",f"Pedidos archivados: {n}"),owner=self)
+
+    def verificar_caja(self):
+        storage_worker().submit(caja_verificar_saldo,callback=self._show_verificacion,owner=self)
+
+    def _show_verificacion(self,saldos:Tuple[float,float]):
+        en_memoria,calculado=saldos
+        if abs(en_memoria-calculado)<0.005:
+            QMessageBox.information(self,"Caja",f"Saldo consistente: $ {calculado:,.2f}")
+        else:
+            QMessageBox.warning(self,"Caja",f"Saldo registrado: $ {en_memoria:,.2f}\nSaldo recalculado: $ {calculado:,.2f}")
+
     def open_kitchen(self):
         self.kitchen=KitchenWindow()
         self.kitchen.showMaximized()
@@ -815,11 +594,13 @@ class MainWindow(QMainWindow):
         QFileDialog.getOpenFileName(self,"Abrir CSV",folder,"CSV (*.csv)")
 
     def open_analytics(self):
+        # matplotlib solo se importa la primera vez que se abre la analítica.
+        from analitica import AnalyticsWindow
         dlg=AnalyticsWindow(self)
         dlg.exec()
 
     def add_product(self,name:str,price:float):
-        self.current_order.append((name,price))
+        self.current_order.append(LineItem(name,1,price))
         self.update_order_display()
 
     def remove_selected_product(self):
@@ -830,81 +611,78 @@ class MainWindow(QMainWindow):
     def update_order_display(self):
         self.order_list.clear()
         total=0.0
-        for item,price in self.current_order:
-            self.order_list.addItem(f"{item} - ${price:.2f}")
-            total+=price
+        for it in self.current_order:
+            self.order_list.addItem(f"{it.label()} - ${it.importe:.2f}")
+            total+=it.importe
         self.order_list.addItem(f"TOTAL: ${total:.2f}")
 
+    def _ajuste_movimientos(self,diff:float)->List[Tuple[str,float,float,str]]:
+        movs=[]
+        if diff>0:
+            adj=AjusteDialog(diff,self)
+            if adj.exec()==QDialog.DialogCode.Accepted:
+                v=adj.valores()
+                if "efectivo" in v["accion"].lower() and v["cash"]>0:
+                    movs.append(("AJUSTE_COBRO",v["cash"],0.0,"Cobro extra por actualización"))
+        elif diff<0:
+            devolver=abs(diff)
+            adj=AjusteDialog(-devolver,self)
+            if adj.exec()==QDialog.DialogCode.Accepted:
+                v=adj.valores()
+                if v["accion"]=="Devolver en efectivo" and v["cash"]>0:
+                    movs.append(("AJUSTE_DEVOLUCION",0.0,v["cash"],"Devolución en efectivo"))
+                elif v["accion"]=="Devolver en tarjeta" and v["card"]>0:
+                    movs.append(("AJUSTE_DEVOLUCION_TARJETA",0.0,0.0,f"TJ={v['card']:.2f}"))
+        return movs
+
     def set_payment_and_save(self):
         table=self.table_number.text().strip()
         comments=self.comments_edit.toPlainText().strip()
         if not table or not self.current_order:
             QMessageBox.critical(self,"Error","Completa el número de mesa y agrega al menos un producto.")
             return
-        total=sum(p for _,p in self.current_order)
-        items_str=", ".join([n for n,_ in self.current_order])
-        ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        total=sum(it.importe for it in self.current_order)
+        items=group_items(self.current_order)
+        ts=datetime.now().replace(microsecond=0)
         preset=self.current_payment if self.current_payment else None
         dlg=PaymentDialog(total,self,preset=preset)
         if dlg.exec()!=QDialog.DialogCode.Accepted:
             return
         self.current_payment=dlg.get_values()
         pay=self.current_payment
+        ingreso_ef=max(float(pay["EfectivoIngresado"])-float(pay["Cambio"]),0.0)
+        cambio=float(pay["Cambio"])
+        pago=dict(metodo_pago=pay.get("MetodoPago",""),efectivo=to_cents(pay.get("EfectivoIngresado")),tarjeta=to_cents(pay.get("TarjetaIngresado")),
+                  cambio=to_cents(pay.get("Cambio")),restante=to_cents(pay.get("Restante")))
         if self.current_order_id is None:
-            oid=next_order_id()
-            rows=read_orders()
-            new_row=[
-                str(oid),"",table,items_str,f"{total:.2f}",ts,"Pendiente",comments,
-                pay.get("MetodoPago",""),pay.get("EfectivoIngresado","0"),pay.get("TarjetaIngresado","0"),
-                pay.get("Cambio","0"),pay.get("Restante","0")
-            ]
-            rows.append(new_row); write_orders(rows)
-            ingreso_ef=max(float(pay["EfectivoIngresado"])-float(pay["Cambio"]),0.0)
-            if ingreso_ef>0: caja_registrar("VENTA",str(oid),ingreso_ef,0.0,"Venta registrada")
-            if float(pay["Cambio"])>0: caja_registrar("CAMBIO",str(oid),0.0,float(pay["Cambio"]),"Cambio entregado")
-            QMessageBox.information(self,"Éxito",f"Comanda registrada y cobrada. ID: {oid}  Total: ${total:.2f}")
-            self.clear_order(); self.load_all_orders_for_day()
+            movs=[]
+            if ingreso_ef>0: movs.append(("VENTA",ingreso_ef,0.0,"Venta registrada"))
+            if cambio>0: movs.append(("CAMBIO",0.0,cambio,"Cambio entregado"))
+            t0=time.perf_counter()
+            def guardado(oid:int):
+                metricas().registrar_desde("ui.guardar",t0)
+                change_feed().publish(EV_CREATE,oid)
+                QMessageBox.information(self,"Éxito",f"Comanda registrada y cobrada. ID: {oid}  Total: ${total:.2f}")
+                self.clear_order()
+            storage_worker().submit(guardar_pedido,Order(0,table,items,to_cents(total),ts,comentarios=comments,**pago),movs,None,True,
+                                    callback=guardado,owner=self)
         else:
-            rows=read_orders()
-            found_idx=None; old_row=None
-            for i,r in enumerate(rows):
-                if i==0: continue
-                try:
-                    if int(r[0])==self.current_order_id:
-                        found_idx=i; old_row=r; break
-                except: pass
-            if found_idx is None:
+            oid=self.current_order_id
+            old=storage_worker().call(get_order,oid)
+            if old is None:
                 QMessageBox.critical(self,"Error","No se encontró el pedido para actualizar.")
                 return
-            old_total=float(old_row[4])
-            nueva=[
-                str(self.current_order_id),"",table,items_str,f"{total:.2f}",ts,old_row[6] if len(old_row)>6 and old_row[6] else "Pendiente",comments,
-                pay.get("MetodoPago",""),pay.get("EfectivoIngresado","0"),pay.get("TarjetaIngresado","0"),
-                pay.get("Cambio","0"),pay.get("Restante","0")
-            ]
-            rows[found_idx]=nueva; write_orders(rows)
-            diff=round(total-old_total,2)
-            if diff!=0:
-                if diff>0:
-                    adj=AjusteDialog(diff,self)
-                    if adj.exec()==QDialog.DialogCode.Accepted:
-                        v=adj.valores()
-                        if "efectivo" in v["accion"].lower() and v["cash"]>0:
-                            caja_registrar("AJUSTE_COBRO",str(self.current_order_id),v["cash"],0.0,"Cobro extra por actualización")
-                else:
-                    devolver=abs(diff)
-                    adj=AjusteDialog(-devolver,self)
-                    if adj.exec()==QDialog.DialogCode.Accepted:
-                        v=adj.valores()
-                        if v["accion"]=="Devolver en efectivo" and v["cash"]>0:
-                            caja_registrar("AJUSTE_DEVOLUCION",str(self.current_order_id),0.0,v["cash"],"Devolución en efectivo")
-                        elif v["accion"]=="Devolver en tarjeta" and v["card"]>0:
-                            caja_registrar("AJUSTE_DEVOLUCION_TARJETA",str(self.current_order_id),0.0,0.0,f"TJ={v['card']:.2f}")
-            ingreso_ef=max(float(pay["EfectivoIngresado"])-float(pay["Cambio"]),0.0)
-            if ingreso_ef>0: caja_registrar("VENTA_ACT",str(self.current_order_id),ingreso_ef,0.0,"Actualización de cobro")
-            if float(pay["Cambio"])>0: caja_registrar("CAMBIO_ACT",str(self.current_order_id),0.0,float(pay["Cambio"]),"Cambio entregado (actualización)")
-            QMessageBox.information(self,"Actualizado",f"Pedido {self.current_order_id} actualizado y cobrado. Total: ${total:.2f}")
-            self.clear_order(); self.load_all_orders_for_day()
+            nueva=Order(oid,table,items,to_cents(total),ts,old.estado,comments,cliente=old.cliente,**pago)
+            movs=self._ajuste_movimientos(round(total-old.total/100,2))
+            if ingreso_ef>0: movs.append(("VENTA_ACT",ingreso_ef,0.0,"Actualización de cobro"))
+            if cambio>0: movs.append(("CAMBIO_ACT",0.0,cambio,"Cambio entregado (actualización)"))
+            t0=time.perf_counter()
+            def guardado(_):
+                metricas().registrar_desde("ui.guardar",t0)
+                change_feed().publish(EV_UPDATE,oid)
+                QMessageBox.information(self,"Actualizado",f"Pedido {oid} actualizado y cobrado. Total: ${total:.2f}")
+                self.clear_order()
+            storage_worker().submit(guardar_pedido,nueva,movs,self.current_version,callback=guardado,owner=self)
 
     def update_order_after_change(self):
         if self.current_order_id is None:
@@ -915,139 +693,159 @@ class MainWindow(QMainWindow):
         if not table or not self.current_order:
             QMessageBox.critical(self,"Error","Completa el número de mesa y agrega al menos un producto.")
             return
-        rows=read_orders()
-        found_idx=None; old_row=None
-        for i,r in enumerate(rows):
-            if i==0: continue
-            try:
-                if int(r[0])==self.current_order_id:
-                    found_idx=i; old_row=r; break
-            except: pass
-        if found_idx is None:
+        oid=self.current_order_id
+        old=storage_worker().call(get_order,oid)
+        if old is None:
             QMessageBox.critical(self,"Error","No se encontró el pedido para actualizar.")
             return
-        old_total=float(old_row[4])
-        new_total=sum(p for _,p in self.current_order)
-        items_str=", ".join([n for n,_ in self.current_order])
-        ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        rows[found_idx]=[
-            str(self.current_order_id),"",table,items_str,f"{new_total:.2f}",ts,old_row[6] if len(old_row)>6 and old_row[6] else "Pendiente",comments,
-            old_row[8] if len(old_row)>8 else "", old_row[9] if len(old_row)>9 else "0", old_row[10] if len(old_row)>10 else "0",
-            old_row[11] if len(old_row)>11 else "0", old_row[12] if len(old_row)>12 else "0"
-        ]
-        write_orders(rows)
-        diff=round(new_total-old_total,2)
-        if diff!=0:
-            if diff>0:
-                adj=AjusteDialog(diff,self)
-                if adj.exec()==QDialog.DialogCode.Accepted:
-                    v=adj.valores()
-                    if "efectivo" in v["accion"].lower() and v["cash"]>0:
-                        caja_registrar("AJUSTE_COBRO",str(self.current_order_id),v["cash"],0.0,"Cobro extra por actualización")
-            else:
-                devolver=abs(diff)
-                adj=AjusteDialog(-devolver,self)
-                if adj.exec()==QDialog.DialogCode.Accepted:
-                    v=adj.valores()
-                    if v["accion"]=="Devolver en efectivo" and v["cash"]>0:
-                        caja_registrar("AJUSTE_DEVOLUCION",str(self.current_order_id),0.0,v["cash"],"Devolución en efectivo")
-                    elif v["accion"]=="Devolver en tarjeta" and v["card"]>0:
-                        caja_registrar("AJUSTE_DEVOLUCION_TARJETA",str(self.current_order_id),0.0,0.0,f"TJ={v['card']:.2f}")
-        QMessageBox.information(self,"Actualizado",f"Pedido {self.current_order_id} actualizado. Diferencia: ${diff:.2f}")
-        self.clear_order(); self.load_all_orders_for_day()
+        new_total=sum(it.importe for it in self.current_order)
+        nueva=old.replace(mesa=table,items=tuple(group_items(self.current_order)),total=to_cents(new_total),
+                          fecha=datetime.now().replace(microsecond=0),comentarios=comments)
+        diff=round(new_total-old.total/100,2)
+        movs=self._ajuste_movimientos(diff)
+        t0=time.perf_counter()
+        def guardado(_):
+            metricas().registrar_desde("ui.guardar",t0)
+            change_feed().publish(EV_UPDATE,oid)
+            QMessageBox.information(self,"Actualizado",f"Pedido {oid} actualizado. Diferencia: ${diff:.2f}")
+            self.clear_order()
+        storage_worker().submit(guardar_pedido,nueva,movs,self.current_version,callback=guardado,owner=self)
 
     def load_order(self):
         text=self.ticket_edit.text().strip()
         if not text.isdigit():
             QMessageBox.critical(self,"Error","Ingresa un ID numérico válido."); return
         oid=int(text)
-        rows=read_orders()
-        found=None
-        for r in rows[1:]:
-            try:
-                if int(r[0])==oid:
-                    found=r; break
-            except: pass
+        t0=time.perf_counter()
+        found=storage_worker().call(get_order,oid)
         if not found:
             QMessageBox.critical(self,"Error",f"No existe el pedido con ID {oid}."); return
-        self.current_order_id=oid
-        self.table_number.setText(found[2])
-        self.comments_edit.setPlainText(found[7] if len(found)>7 else "")
+        self.current_order_id=oid; self.current_version=found.version
+        self.table_number.setText(found.mesa)
+        self.comments_edit.setPlainText(found.comentarios)
         self.current_order.clear()
-        for it in parse_products(found[3]):
-            self.current_order.append((it,PRODUCTS.get(it,0.0)))
+        # Se conservan los precios con los que se vendió, aunque el catálogo haya cambiado.
+        for it in found.items:
+            self.current_order.extend([it._replace(qty=1)]*it.qty)
         self.current_payment={
-            "MetodoPago":found[8] if len(found)>8 else "",
-            "EfectivoIngresado":found[9] if len(found)>9 else "0",
-            "TarjetaIngresado":found[10] if len(found)>10 else "0",
-            "Cambio":found[11] if len(found)>11 else "0",
-            "Restante":found[12] if len(found)>12 else "0",
+            "MetodoPago":found.metodo_pago,
+            "EfectivoIngresado":cents_str(found.efectivo),
+            "TarjetaIngresado":cents_str(found.tarjeta),
+            "Cambio":cents_str(found.cambio),
+            "Restante":cents_str(found.restante),
         }
         self.update_order_display()
+        metricas().registrar_desde("ui.cargar_pedido",t0)
 
     def change_order_status(self,new_status:str):
         oid=self._selected_order_id_from_lists()
         if oid is None:
             QMessageBox.warning(self,"Aviso","Selecciona un pedido en alguna de las listas."); return
-        rows=read_orders()
-        for i,r in enumerate(rows):
-            if i==0: continue
-            try:
-                if int(r[0])==oid:
-                    rows[i][6]=new_status; break
-            except: pass
-        write_orders(rows); self.load_all_orders_for_day()
-        QMessageBox.information(self,"OK",f"Pedido {oid} marcado como {new_status}.")
+        t0=time.perf_counter()
+        def done(o:Optional[Order]):
+            # La fila pasa de lista en cuanto se guarda, sin esperar el aviso; no se selecciona otra sola.
+            self.pedidos.actualizar_pedido(oid,o,self._selected_day().isoformat())
+            self.manage_list_pending.clearSelection(); self.manage_list_delivered.clearSelection()
+            metricas().registrar_desde("ui.cambio_estado",t0)
+            change_feed().publish(EV_STATUS,oid)
+            QMessageBox.information(self,"OK",f"Pedido {oid} marcado como {new_status}.")
+        storage_worker().submit(_cambiar_estado,oid,new_status,callback=done,owner=self)
+
+    def _lista_pedidos(self,entregados:bool)->QListView:
+        proxy=FiltroEstado(entregados,self); proxy.setSourceModel(self.pedidos)
+        view=QListView(); view.setModel(proxy); view.setUniformItemSizes(True)
+        return view
 
     def _selected_order_id_from_lists(self)->Optional[int]:
-        def parse_from(text:str)->Optional[int]:
-            try: return int(text.split("|")[0].split(":")[1].strip())
-            except: return None
-        it=self.manage_list_pending.currentItem()
-        if it:
-            oid=parse_from(it.text())
-            if oid is not None: return oid
-        it=self.manage_list_delivered.currentItem()
-        if it:
-            oid=parse_from(it.text())
-            if oid is not None: return oid
+        for view in (self.manage_list_pending,self.manage_list_delivered):
+            sel=view.selectionModel().selectedIndexes()
+            if sel: return sel[0].data(ID_ROLE)
         return None
 
-    def load_all_orders_for_day(self):
-        self.manage_list_pending.clear(); self.manage_list_delivered.clear()
-        rows=read_orders(); data=rows[1:]
+    def _selected_day(self)->date:
         qd=self.date_picker.date()
-        selected_day=date(qd.year(),qd.month(),qd.day())
-        filtered=[r for r in data if parse_dt(r[5]).date()==selected_day]
-        filtered.sort(key=lambda r: parse_dt(r[5]))
-        for r in filtered:
-            has_note=" • Nota" if (len(r)>7 and r[7].strip()) else ""
-            line=f"ID: {r[0]} | Mesa: {r[2]} | Total: ${r[4]} | Estado: {r[6]} | {r[5]}{has_note}"
-            if r[6]=="Entregado": self.manage_list_delivered.addItem(line)
-            else: self.manage_list_pending.addItem(line)
+        return date(qd.year(),qd.month(),qd.day())
+
+    def load_all_orders_for_day(self):
+        t0=time.perf_counter()
+        def llenar(orders:List[Order]):
+            self.pedidos.actualizar(orders); metricas().registrar_desde("ui.lista_pedidos",t0)
+        storage_worker().submit(orders_for_day,self._selected_day(),callback=llenar,owner=self)
+
+    def _avisado(self,tipo:str,order_id:int):
+        self._avisados.add(order_id); self._aviso.start()
+
+    def _aplicar_avisos(self):
+        ids=sorted(self._avisados); self._avisados=set()
+        if not ids: return
+        day=self._selected_day().isoformat()
+        t0=time.perf_counter()
+        def aplicar(orders:List[Optional[Order]]):
+            for oid,o in zip(ids,orders): self.pedidos.actualizar_pedido(oid,o,day)
+            metricas().registrar_desde("ui.lista_pedidos",t0)
+        storage_worker().submit(lambda: [get_order(i) for i in ids],callback=aplicar,owner=self)
 
     def clear_order(self):
-        self.current_order_id=None
+        self.current_order_id=None; self.current_version=None
         self.table_number.clear(); self.comments_edit.clear()
         self.current_order.clear(); self.current_payment={}
         self.update_order_display()
 
-def _make_big(btn:QPushButton):
-    btn.setMinimumHeight(44)
-    _set_btn_font(btn,14)
+class BusyCursor(QObject):
+    def __init__(self,parent:QObject):
+        super().__init__(parent)
+        self._shown=False
+        # Solo se muestra si la operación tarda; así el refresco de cocina no parpadea.
+        self._timer=QTimer(self); self._timer.setSingleShot(True); self._timer.setInterval(150)
+        self._timer.timeout.connect(self._show)
+        storage_worker().busy_changed.connect(self._changed)
+
+    def _changed(self,busy:bool):
+        if busy:
+            self._timer.start(); return
+        self._timer.stop()
+        if self._shown:
+            QApplication.restoreOverrideCursor(); self._shown=False
+
+    def _show(self):
+        QApplication.setOverrideCursor(Qt.CursorShape.BusyCursor); self._shown=True
+
+def _cambiar_estado(order_id:int,status:str)->Optional[Order]:
+    set_order_status(order_id,status)
+    return get_order(order_id)
+
+def _precargar_analitica():
+    # Las partes pesadas que no tocan widgets (numpy, matplotlib.figure) se importan en segundo plano;
+    # el backend Qt de matplotlib se deja para el hilo de la interfaz al abrir la ventana.
+    def cargar():
+        try:
+            import matplotlib.figure
+            import ventas_columnar
+        except ImportError:
+            pass
+    threading.Thread(target=cargar,name="precarga-analitica",daemon=True).start()
 
-def _set_btn_font(widget, size:int):
-    f=widget.font()
-    f.setPointSize(size)
-    widget.setFont(f)
+def _archivar_automatico():
+    # Una vez al día, en el hilo de almacenamiento: no bloquea la interfaz al abrir.
+    cfg=load_config(); hoy=datetime.now().strftime("%Y-%m-%d")
+    if not cfg.get("archivo_automatico",True) or cfg.get("archivo_ultimo")==hoy: return
+    def listo(_):
+        cfg=load_config(); cfg["archivo_ultimo"]=hoy; save_config(cfg)
+    storage_worker().submit(archivar_cerrados,callback=listo)
 
 def main():
     import sys
-    ensure_csv(); ensure_caja()
+    ensure_storage()
     app=QApplication(sys.argv)
     dark_palette(app)
     app.setStyleSheet("QPushButton{min-height:40px; font-size:14px;}")
+    BusyCursor(app)
+    volcado=QTimer(app); volcado.timeout.connect(metricas().volcar); volcado.start(METRICS_FLUSH_MS)
+    app.aboutToQuit.connect(metricas().volcar)
     w=MainWindow(); w.show()
+    if load_config().get("precargar_analitica",True):
+        QTimer.singleShot(PRELOAD_DELAY_MS,_precargar_analitica)
+    QTimer.singleShot(PRELOAD_DELAY_MS,_archivar_automatico)
     sys.exit(app.exec())
 
 if __name__=="__main__":
@@ -0,0 +1,180 @@
+from __future__ import annotations
+import csv
+import gzip
+import io
+import json
+import os
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Set
+
+from metricas import contar
+from pedido import CSV_HEADER, Order, OrderStatus
+
+ARCHIVE_DIR = "archivo"
+MANIFEST_NAME = "manifiesto.json"
+# Archivos descomprimidos que se conservan en memoria (consultas repetidas de cortes y cocina).
+ARCHIVE_CACHE = 4
+
+def clave_periodo(day:str,periodo:str)->str:
+    return day[:4] if periodo=="año" else day[:7]
+
+def inicio_periodo(hoy:date,periodo:str)->str:
+    return f"{hoy.year:04d}-01-01" if periodo=="año" else f"{hoy.year:04d}-{hoy.month:02d}-01"
+
+def dias_archivables(orders:List[Order],antes:str,forzados:Set[str]=frozenset())->Dict[str,List[Order]]:
+    # Un día se archiva completo y solo si ya no tiene pedidos pendientes; los forzados son días
+    # que el manifiesto ya declara archivados (archivado interrumpido) y se terminan de mover.
+    por_dia:Dict[str,List[Order]]={}
+    for o in orders:
+        if o.fecha is None: continue
+        d=o.day
+        if d<antes or d in forzados: por_dia.setdefault(d,[]).append(o)
+    return {d:os_ for d,os_ in por_dia.items()
+            if d in forzados or all(o.estado is OrderStatus.ENTREGADO for o in os_)}
+
+def _ventas_dia(orders:List[Order])->Dict[str,list]:
+    # producto -> [cantidad, importe, tickets]; cada pedido es de un solo día, así que los
+    # tickets distintos de un rango son la suma de los de cada día.
+    out:Dict[str,list]={}
+    for o in orders:
+        vistos=set()
+        for it in o.items:
+            c=out.setdefault(it.name,[0,0.0,0])
+            c[0]+=it.qty; c[1]+=it.qty*it.price
+            if it.name not in vistos: c[2]+=1; vistos.add(it.name)
+    for c in out.values(): c[1]=round(c[1],2)
+    return out
+
+def _file_sig(path:str):
+    try: st=os.stat(path)
+    except OSError: return None
+    return (st.st_mtime_ns,st.st_size)
+
+class Archivo:
+    def __init__(self,carpeta:str=ARCHIVE_DIR):
+        self.carpeta=carpeta
+        self.archivos:Dict[str,Dict]={}
+        self.dias:Dict[str,str]={}
+        self.max_id=0
+        self._sig=None
+        self._cache:"OrderedDict[str,tuple]"=OrderedDict()
+
+    @property
+    def manifiesto(self)->str:
+        return os.path.join(self.carpeta,MANIFEST_NAME)
+
+    def sync(self):
+        sig=_file_sig(self.manifiesto)
+        if sig==self._sig: return
+        data={}
+        if sig is not None:
+            with open(self.manifiesto,"r",encoding="utf-8") as f:
+                data=json.load(f)
+        self.archivos={e["archivo"]:e for e in data.get("archivos",[])}
+        self.dias={d:n for n,e in self.archivos.items() for d in e.get("dias",())}
+        self.max_id=max((e["ids"][1] for e in self.archivos.values() if e.get("ids")),default=0)
+        self._sig=sig
+
+    def _cargar(self,nombre:str)->Dict[int,Order]:
+        path=os.path.join(self.carpeta,nombre)
+        sig=_file_sig(path)
+        hit=self._cache.get(nombre)
+        if hit is not None and hit[0]==sig:
+            self._cache.move_to_end(nombre); return hit[1]
+        if sig is None: return {}
+        with open(path,"rb") as f:
+            comprimido=f.read()
+        rows=list(csv.reader(io.StringIO(gzip.decompress(comprimido).decode("utf-8"),newline="")))
+        contar(len(rows)-1,len(comprimido))
+        orders={}
+        for r in rows[1:]:
+            if r and r[0].strip().isdigit():
+                o=Order.from_row(r); orders[o.id]=o
+        self._cache[nombre]=(sig,orders)
+        while len(self._cache)>ARCHIVE_CACHE: self._cache.popitem(last=False)
+        return orders
+
+    def orders_for_day(self,day:str)->List[Order]:
+        nombre=self.dias.get(day)
+        if nombre is None: return []
+        out=[o for o in self._cargar(nombre).values() if o.day==day]
+        out.sort(key=lambda o: o.sort_key)
+        return out
+
+    def get(self,order_id:int)->Optional[Order]:
+        for nombre,e in self.archivos.items():
+            ids=e.get("ids")
+            if ids and ids[0]<=order_id<=ids[1]:
+                o=self._cargar(nombre).get(order_id)
+                if o is not None: return o
+        return None
+
+    def all_orders(self)->List[Order]:
+        out:List[Order]=[]
+        for nombre in sorted(self.archivos):
+            # Solo los días que el manifiesto declara; un archivo recién reescrito puede traer más.
+            dias=set(self.archivos[nombre].get("dias",()))
+            out.extend(o for o in self._cargar(nombre).values() if o.day in dias)
+        return out
+
+    def ventas(self,desde:Optional[str],hasta:Optional[str])->Dict[str,list]:
+        acc:Dict[str,list]={}
+        for e in self.archivos.values():
+            for day,prods in e.get("ventas",{}).items():
+                if (desde and day<desde) or (hasta and day>hasta): continue
+                contar(len(prods))
+                for name,(qty,amount,tickets) in prods.items():
+                    a=acc.setdefault(name,[0,0.0,0])
+                    a[0]+=qty; a[1]+=amount; a[2]+=tickets
+        return acc
+
+    def guardar(self,orders:List[Order],periodo:str):
+        # Primero los archivos comprimidos y al final el manifiesto: mientras el manifiesto no los
+        # nombre, nadie los lee, así que un corte de luz a la mitad no deja datos a medias visibles.
+        os.makedirs(self.carpeta,exist_ok=True)
+        self.sync()
+        grupos:Dict[str,List[Order]]={}
+        for o in orders:
+            # Un día ya archivado sigue en su archivo aunque después se cambie el periodo configurado.
+            previo=self.dias.get(o.day)
+            clave=self.archivos[previo]["periodo"] if previo else clave_periodo(o.day,periodo)
+            grupos.setdefault(clave,[]).append(o)
+        for clave,nuevos in grupos.items():
+            nombre=f"comandas_{clave}.csv.gz"
+            todos=dict(self._cargar(nombre)) if nombre in self.archivos else {}
+            for o in nuevos: todos[o.id]=o
+            filas=sorted(todos.values(),key=lambda o: (o.sort_key,o.id))
+            buf=io.StringIO(newline="")
+            w=csv.writer(buf); w.writerow(CSV_HEADER); w.writerows(o.to_row() for o in filas)
+            path=os.path.join(self.carpeta,nombre); tmp=path+".tmp"
+            with open(tmp,"wb") as f:
+                f.write(gzip.compress(buf.getvalue().encode("utf-8"),compresslevel=6))
+                f.flush(); os.fsync(f.fileno())
+            os.replace(tmp,path)
+            por_dia:Dict[str,List[Order]]={}
+            for o in filas: por_dia.setdefault(o.day,[]).append(o)
+            self.archivos[nombre]={
+                "archivo":nombre,"periodo":clave,"dias":sorted(por_dia),"pedidos":len(filas),
+                "ids":[min(todos),max(todos)],"bytes":os.path.getsize(path),
+                "ventas":{d:_ventas_dia(os_) for d,os_ in sorted(por_dia.items())},
+            }
+            self._cache.pop(nombre,None)
+        tmp=self.manifiesto+".tmp"
+        with open(tmp,"w",encoding="utf-8") as f:
+            json.dump({"version":1,"archivos":[self.archivos[n] for n in sorted(self.archivos)]},f,ensure_ascii=False)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp,self.manifiesto)
+        # Los reemplazos deben estar en disco antes de que se retiren los pedidos del CSV activo.
+        if os.name!="nt":
+            fd=os.open(self.carpeta,os.O_RDONLY)
+            try: os.fsync(fd)
+            finally: os.close(fd)
+        self._sig=None; self.sync()
+
+_ARCHIVO:Optional[Archivo]=None
+
+def archivo()->Archivo:
+    global _ARCHIVO
+    if _ARCHIVO is None: _ARCHIVO=Archivo()
+    return _ARCHIVO
@@ -0,0 +1,144 @@
+"""Benchmark sin interfaz visible de las rutas críticas de almacenamiento y pantallas.
+
+Para cada tamaño genera (o reutiliza) un historial sintético con
+generar_historial.py. Cada medición corre en un proceso nuevo sobre una copia
+de esos datos, con QT_QPA_PLATFORM=offscreen. El resultado es JSON con
+mínimo/p50/p95/máximo en milisegundos por operación, para comparar versiones:
+
+    python benchmark.py --pedidos 1000,100000 --salida antes.json
+    python benchmark.py --pedidos 1000,100000 --salida despues.json --comparar antes.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+AQUI=os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,AQUI)
+
+def _stats(muestras):
+    s=sorted(muestras); n=len(s)
+    pct=lambda p: s[min(n-1,int(round(p*(n-1))))]
+    return {"n":n,"min_ms":round(s[0],3),"p50_ms":round(pct(0.5),3),"p95_ms":round(pct(0.95),3),"max_ms":round(s[-1],3)}
+
+def _medir(carpeta:str,motor:str,reps:int)->dict:
+    # Corre dentro del subproceso: estado global limpio y carga en frío real.
+    os.environ.setdefault("QT_QPA_PLATFORM","offscreen")
+    os.chdir(carpeta)
+    with open("config_caja.json","w",encoding="utf-8") as f:
+        json.dump({"almacenamiento":motor,"precargar_analitica":False,"fecha":date.today().strftime("%Y-%m-%d")},f)
+    from PyQt6.QtWidgets import QApplication, QDialog, QMessageBox
+    for nombre in ("information","critical","warning"):
+        setattr(QMessageBox,nombre,staticmethod(lambda *a,**k: None))
+    t=time.perf_counter()
+    import app, storage
+    from storage_worker import storage_worker
+    ops={}
+    ops["import_app"]=[(time.perf_counter()-t)*1000]
+    app.FondoCajaDialog.exec=lambda self: QDialog.DialogCode.Rejected
+    qa=QApplication([])
+    def settle():
+        for _ in range(3):
+            storage_worker().drain(); qa.processEvents()
+    def medir(nombre,fn,n=reps):
+        m=ops.setdefault(nombre,[])
+        for _ in range(n):
+            t=time.perf_counter(); fn(); m.append((time.perf_counter()-t)*1000)
+    medir("ensure_storage",storage.ensure_storage,1)
+    medir("read_orders_frio",storage.read_orders,1)
+    medir("read_orders",storage.read_orders)
+    medir("next_order_id",storage.next_order_id)
+    medir("caja_registrar",lambda: storage.caja_registrar("BENCH","-",0.0,0.0,"benchmark"))
+    ventanas=[]
+    medir("main_window_inicio",lambda: (ventanas.append(app.MainWindow()),settle()),1)
+    w=ventanas[0]
+    medir("load_all_orders_for_day",lambda: (w.load_all_orders_for_day(),settle()))
+    k=app.KitchenWindow(); settle()
+    medir("kitchen_refresh",lambda: (setattr(k,"_last_key",None),k.refresh(),settle()))
+    medir("kitchen_refresh_sin_cambios",lambda: (k.refresh(),settle()))
+    c=app.CorteDialog(); settle()
+    medir("corte_recalc_hoy",lambda: (c.recalc(),settle()))
+    ayer=date.today()-timedelta(days=1)
+    c.date.blockSignals(True); c.date.setDate(ayer); c.date.blockSignals(False)
+    medir("corte_recalc_dia_cerrado_frio",lambda: (c.recalc(),settle()),1)
+    medir("corte_recalc_dia_cerrado",lambda: (c.recalc(),settle()))
+    t=time.perf_counter()
+    import analitica
+    ops["import_analitica"]=[(time.perf_counter()-t)*1000]
+    an=analitica.AnalyticsWindow(); settle()
+    for modo in ("General","Semanal","Diario"):
+        an.mode.blockSignals(True); an.mode.setCurrentText(modo); an.mode.blockSignals(False)
+        medir(f"analytics_compute_{modo.lower()}",lambda: (an.compute(),settle()))
+    return {k:_stats(v) for k,v in ops.items()}
+
+def _commit()->str:
+    try:
+        return subprocess.run(["git","rev-parse","--short","HEAD"],cwd=AQUI,capture_output=True,text=True,timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+def _comparar(base:dict,actual:dict,umbral:float):
+    print(f"{'tamaño':>8} {'operación':<32} {'base p50':>10} {'actual p50':>10} {'x':>6}")
+    for tam,datos in actual["tamaños"].items():
+        previo=base.get("tamaños",{}).get(tam)
+        if not previo: continue
+        for op,st in datos["ops"].items():
+            b=previo["ops"].get(op)
+            if not b or b["p50_ms"]<=0: continue
+            r=st["p50_ms"]/b["p50_ms"]
+            marca=" <- regresión" if r>umbral else ""
+            print(f"{tam:>8} {op:<32} {b['p50_ms']:>10.2f} {st['p50_ms']:>10.2f} {r:>6.2f}{marca}")
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pedidos",default="1000,100000",help="tamaños separados por coma, p. ej. 1000,100000,1000000")
+    ap.add_argument("--meses",type=int,default=6)
+    ap.add_argument("--motor",choices=("csv","sqlite"),default="csv")
+    ap.add_argument("--repeticiones",type=int,default=5)
+    ap.add_argument("--datos",default=os.path.join(tempfile.gettempdir(),"comandas_bench"),help="carpeta donde se guardan los historiales generados")
+    ap.add_argument("--salida",help="archivo JSON de resultados (por defecto, salida estándar)")
+    ap.add_argument("--comparar",help="JSON de una corrida anterior para comparar p50")
+    ap.add_argument("--umbral",type=float,default=1.2)
+    ap.add_argument("--_medir",help=argparse.SUPPRESS)
+    args=ap.parse_args()
+    if args._medir:
+        print(json.dumps(_medir(args._medir,args.motor,args.repeticiones))); return
+    from generar_historial import generar
+    res={"meta":{"commit":_commit(),"python":platform.python_version(),"plataforma":platform.platform(),
+                 "fecha":time.strftime("%Y-%m-%d %H:%M:%S"),"motor":args.motor,"repeticiones":args.repeticiones},
+         "tamaños":{}}
+    for n in [int(x) for x in args.pedidos.split(",") if x.strip()]:
+        origen=os.path.join(args.datos,f"{n}_{args.meses}m_{date.today()}")
+        info_path=os.path.join(origen,"generado.json")
+        if not os.path.exists(info_path):
+            info=generar(origen,n,args.meses)
+            with open(info_path,"w",encoding="utf-8") as f: json.dump(info,f)
+        with open(info_path,"r",encoding="utf-8") as f: info=json.load(f)
+        copia=tempfile.mkdtemp(prefix=f"bench_{n}_")
+        try:
+            shutil.copytree(origen,copia,dirs_exist_ok=True)
+            out=subprocess.run([sys.executable,os.path.abspath(__file__),"--_medir",copia,"--motor",args.motor,
+                                "--repeticiones",str(args.repeticiones)],capture_output=True,text=True)
+            if out.returncode!=0:
+                sys.stderr.write(out.stderr); sys.exit(out.returncode)
+            res["tamaños"][str(n)]={"datos":info,"ops":json.loads(out.stdout.strip().splitlines()[-1])}
+        finally:
+            shutil.rmtree(copia,ignore_errors=True)
+        print(f"{n} pedidos listo",file=sys.stderr)
+    texto=json.dumps(res,ensure_ascii=False,indent=2)
+    if args.salida:
+        with open(args.salida,"w",encoding="utf-8") as f: f.write(texto)
+    else:
+        print(texto)
+    if args.comparar:
+        with open(args.comparar,"r",encoding="utf-8") as f: _comparar(json.load(f),res,args.umbral)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark de escritura: ventas por segundo con y sin fsync agrupado.
+
+Cada venta es lo que hace la caja al cobrar un pedido nuevo: siguiente ID,
+alta del pedido y movimientos VENTA y CAMBIO. Cada modo corre en un proceso
+nuevo sobre una carpeta vacía:
+
+    sin_fsync            -> "fsync": false (solo llega al sistema operativo)
+    fsync_por_escritura  -> cada escritura espera a disco
+    fsync_agrupado       -> la venta completa comparte un solo vaciado por archivo
+    transaccion          -> guardar_pedido: pedido y caja en una sola transacción
+
+Uso: python benchmark_escritura.py --ventas 500 --motor csv
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+AQUI=os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,AQUI)
+
+MODOS=("sin_fsync","fsync_por_escritura","fsync_agrupado","transaccion")
+
+def _medir(carpeta:str,motor:str,modo:str,ventas:int)->dict:
+    os.chdir(carpeta)
+    with open("config_caja.json","w",encoding="utf-8") as f:
+        json.dump({"almacenamiento":motor,"fsync":modo!="sin_fsync"},f)
+    import storage
+    from catalogo import PRODUCTS
+    from contextlib import nullcontext
+    from storage import Order, LineItem, append_order, caja_registrar, next_order_id, grupo_escritura, guardar_pedido
+    storage.ensure_storage()
+    items=[LineItem("Torta Mixta",1,PRODUCTS["Torta Mixta"])]
+    escrituras=0
+    t=time.perf_counter()
+    for _ in range(ventas):
+        escrituras+=4
+        if modo=="transaccion":
+            guardar_pedido(Order(0,1,items,12000,datetime.now().replace(microsecond=0),metodo_pago="Efectivo",efectivo=20000,cambio=8000),
+                           [("VENTA",200.0,0.0,"Venta registrada"),("CAMBIO",0.0,80.0,"Cambio entregado")],nuevo=True)
+            continue
+        with (grupo_escritura() if modo=="fsync_agrupado" else nullcontext()):
+            oid=next_order_id()
+            append_order(Order(oid,1,items,12000,datetime.now().replace(microsecond=0),metodo_pago="Efectivo",efectivo=20000,cambio=8000))
+            caja_registrar("VENTA",str(oid),200.0,0.0,"Venta registrada")
+            caja_registrar("CAMBIO",str(oid),0.0,80.0,"Cambio entregado")
+    s=time.perf_counter()-t
+    return {"ventas":ventas,"segundos":round(s,3),"ventas_s":round(ventas/s,1),"escrituras_s":round(escrituras/s,1)}
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--ventas",type=int,default=500)
+    ap.add_argument("--motor",choices=("csv","sqlite"),default="csv")
+    ap.add_argument("--dir",default=tempfile.gettempdir(),help="carpeta base (conviene que esté en el disco real)")
+    ap.add_argument("--_medir",nargs=2,help=argparse.SUPPRESS)
+    args=ap.parse_args()
+    if args._medir:
+        print(json.dumps(_medir(args._medir[0],args.motor,args._medir[1],args.ventas))); return
+    res={}
+    for modo in MODOS:
+        carpeta=tempfile.mkdtemp(prefix=f"bench_escritura_{modo}_",dir=args.dir)
+        try:
+            out=subprocess.run([sys.executable,os.path.abspath(__file__),"--_medir",carpeta,modo,
+                                "--motor",args.motor,"--ventas",str(args.ventas)],capture_output=True,text=True)
+            if out.returncode!=0:
+                sys.stderr.write(out.stderr); sys.exit(out.returncode)
+            res[modo]=json.loads(out.stdout.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(carpeta,ignore_errors=True)
+    print(f"{'modo':<22} {'ventas/s':>10} {'escrituras/s':>13}")
+    for modo,r in res.items():
+        print(f"{modo:<22} {r['ventas_s']:>10.1f} {r['escrituras_s']:>13.1f}")
+
+if __name__=="__main__":
+    main()
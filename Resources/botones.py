@@ -0,0 +1,10 @@
+from PyQt6.QtWidgets import QPushButton
+
+def make_big(btn:QPushButton):
+    btn.setMinimumHeight(44)
+    set_btn_font(btn,14)
+
+def set_btn_font(widget, size:int):
+    f=widget.font()
+    f.setPointSize(size)
+    widget.setFont(f)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import hashlib
+import os
+import random
+from typing import List, Optional
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
+RECONNECT_MS = 1000
+SALUDO = b"HOLA\n"
+
+def _nombre_canal()->str:
+    # Un canal por carpeta de datos: solo se avisan las estaciones que comparten archivos.
+    return "comandas-"+hashlib.sha1(os.path.abspath(os.getcwd()).encode("utf-8")).hexdigest()[:12]
+
+class ChangeFeed(QObject):
+    cambio=pyqtSignal(str,int)
+    conexion=pyqtSignal(bool)
+
+    def __init__(self,nombre:Optional[str]=None):
+        super().__init__()
+        self.nombre=nombre or _nombre_canal()
+        self.server:Optional[QLocalServer]=None
+        self.socket:Optional[QLocalSocket]=None
+        self.clientes:List[QLocalSocket]=[]
+        self._confirmado=False
+        # Con un poco de azar, las estaciones no compiten todas a la vez por ser concentrador.
+        self._reintento=QTimer(self); self._reintento.setSingleShot(True); self._reintento.setInterval(RECONNECT_MS+random.randint(0,500))
+        self._reintento.timeout.connect(self._conectar)
+        self._conectar()
+
+    @property
+    def conectado(self)->bool:
+        # Un cliente solo cuenta como conectado cuando el concentrador le saludó; hasta entonces se sigue sondeando rápido.
+        return self.server is not None or (self.socket is not None and self._confirmado)
+
+    def _intentar_socket(self)->Optional[QLocalSocket.LocalSocketError]:
+        sock=QLocalSocket(self)
+        sock.connectToServer(self.nombre)
+        if sock.waitForConnected(100):
+            sock.readyRead.connect(lambda s=sock: self._leer(s,False))
+            sock.disconnected.connect(self._perdido)
+            self.socket=sock; self._confirmado=False
+            if sock.bytesAvailable(): self._leer(sock,False)
+            return None
+        err=sock.error(); sock.abort(); sock.deleteLater()
+        return err
+
+    def _conectar(self):
+        # El primer proceso de la carpeta hace de concentrador; los demás se conectan a él.
+        if self._intentar_socket() is None: return
+        server=QLocalServer(self)
+        if not server.listen(self.nombre):
+            # Otra estación pudo ganar la carrera: se vuelve a intentar como cliente antes de tocar el socket.
+            err=self._intentar_socket()
+            if err is None:
+                server.deleteLater(); return
+            # Solo se borra si nadie atiende (socket huérfano de un proceso que terminó mal).
+            if err in (QLocalSocket.LocalSocketError.ServerNotFoundError,QLocalSocket.LocalSocketError.ConnectionRefusedError):
+                QLocalServer.removeServer(self.nombre)
+                if server.listen(self.nombre):
+                    server.newConnection.connect(self._nuevo_cliente)
+                    self.server=server; self.conexion.emit(True)
+                    return
+            server.deleteLater(); self._reintento.start()
+            return
+        server.newConnection.connect(self._nuevo_cliente)
+        self.server=server; self.conexion.emit(True)
+
+    def _perdido(self):
+        if self.socket is not None: self.socket.deleteLater()
+        self.socket=None; self._confirmado=False; self.conexion.emit(False)
+        self._reintento.start()
+
+    def _nuevo_cliente(self):
+        while self.server.hasPendingConnections():
+            c=self.server.nextPendingConnection()
+            self.clientes.append(c)
+            c.readyRead.connect(lambda s=c: self._leer(s,True))
+            c.disconnected.connect(lambda s=c: self._cliente_fuera(s))
+            c.write(SALUDO); c.flush()
+
+    def _cliente_fuera(self,c:QLocalSocket):
+        if c in self.clientes: self.clientes.remove(c)
+        c.deleteLater()
+
+    def _leer(self,sock:QLocalSocket,reenviar:bool):
+        while sock.canReadLine():
+            linea=bytes(sock.readLine().data())
+            if linea==SALUDO:
+                if not reenviar and not self._confirmado:
+                    self._confirmado=True; self.conexion.emit(True)
+                continue
+            if reenviar: self._difundir(linea,sock)
+            try:
+                tipo,oid=linea.decode("utf-8").strip().split(",",1)
+                self.cambio.emit(tipo,int(oid))
+            except ValueError:
+                continue
+
+    def _difundir(self,linea:bytes,origen:Optional[QLocalSocket]=None):
+        for c in self.clientes:
+            if c is not origen: c.write(linea); c.flush()
+
+    def publish(self,tipo:str,order_id:int):
+        linea=f"{tipo},{int(order_id)}\n".encode("utf-8")
+        if self.server is not None: self._difundir(linea)
+        elif self.socket is not None: self.socket.write(linea); self.socket.flush()
+        self.cambio.emit(tipo,int(order_id))
+
+_FEED:Optional[ChangeFeed]=None
+
+def change_feed()->ChangeFeed:
+    global _FEED
+    if _FEED is None: _FEED=ChangeFeed()
+    return _FEED
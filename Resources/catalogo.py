@@ -0,0 +1,33 @@
+PRODUCTS = {
+    "Torta de Carne Asada": 110.0,
+    "Torta de Cochinita Pibil": 90.0,
+    "Torta Mixta": 125.0,
+    "Tacos Carne Asada (5)": 110.0,
+    "Tacos Cochinita Pibil (5)": 110.0,
+    "Extra de Queso o Aguacate": 15.0,
+    "Chile Chilaca Relleno": 75.0,
+    "Cochichilaca": 110.0,
+    "Volcán de Cochinita": 90.0,
+    "Volcán de Carne Asada": 90.0,
+    "Volcán Mixto": 90.0,
+    "Tostada de Ceviche de Pescado": 45.0,
+    "Hazla Cochi": 20.0,
+}
+
+# ID estable por producto; no se reutiliza aunque el producto se retire del menú.
+PRODUCT_IDS = {
+    "Torta de Carne Asada": 1,
+    "Torta de Cochinita Pibil": 2,
+    "Torta Mixta": 3,
+    "Tacos Carne Asada (5)": 4,
+    "Tacos Cochinita Pibil (5)": 5,
+    "Extra de Queso o Aguacate": 6,
+    "Chile Chilaca Relleno": 7,
+    "Cochichilaca": 8,
+    "Volcán de Cochinita": 9,
+    "Volcán de Carne Asada": 10,
+    "Volcán Mixto": 11,
+    "Tostada de Ceviche de Pescado": 12,
+    "Hazla Cochi": 13,
+}
+PRODUCT_NAMES = {pid:name for name,pid in PRODUCT_IDS.items()}
@@ -0,0 +1,99 @@
+"""Genera un historial sintético de comandas y caja para pruebas de rendimiento.
+
+Usa el menú real de catalogo.py, horas pico de comida y cena y una mezcla de
+métodos de pago. Los días pasados quedan entregados; el día de hoy deja parte
+de los pedidos pendientes. Escribe los archivos en la carpeta indicada con el
+esquema actual, listos para abrir con la aplicación.
+
+Uso: python generar_historial.py --pedidos 100000 --meses 6 --dir /tmp/historial
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from catalogo import PRODUCTS
+from pedido import LineItem, encode_items
+from storage import CSV_FILE, CAJA_FILE, CSV_HEADER, CAJA_HEADER, SCHEMA_FILE, SCHEMA_VERSION
+
+# (método, probabilidad)
+PAGOS = [("Efectivo",0.6),("Tarjeta",0.3),("Combinado",0.1)]
+# Pesos por hora del día: pico de comida (13-15 h) y de cena (19-21 h).
+HORAS = {9:2,10:3,11:4,12:7,13:10,14:10,15:7,16:4,17:4,18:6,19:9,20:10,21:7,22:3}
+FONDO = 500.0
+
+def _billete(monto:float)->float:
+    for b in (50,100,200,500,1000):
+        if monto<=b: return float(b)
+    return float(int(monto//500+1)*500)
+
+def _items(rng:random.Random,nombres,pesos):
+    lineas=[]
+    for n in rng.choices(nombres,weights=pesos,k=rng.choices((1,2,3,4),weights=(35,35,20,10))[0]):
+        lineas.append(LineItem(n,rng.choices((1,2,3),weights=(75,20,5))[0],PRODUCTS[n]))
+    return lineas
+
+def generar(carpeta:str,pedidos:int,meses:int=6,seed:int=1,hoy:date|None=None)->dict:
+    rng=random.Random(seed)
+    hoy=hoy or date.today()
+    dias=max(1,meses*30)
+    primero=hoy-timedelta(days=dias-1)
+    nombres=list(PRODUCTS)
+    # Los platos fuertes se venden más que los extras y bebidas.
+    pesos=[1 if "Extra" in n or n=="Hazla Cochi" else 3 for n in nombres]
+    horas=list(HORAS); pesos_h=list(HORAS.values())
+    por_dia=[pedidos//dias+(1 if i<pedidos%dias else 0) for i in range(dias)]
+    os.makedirs(carpeta,exist_ok=True)
+    oid=0; saldo=0.0; movs=0
+    with open(os.path.join(carpeta,CSV_FILE),"w",newline="",encoding="utf-8") as fo, \
+         open(os.path.join(carpeta,CAJA_FILE),"w",newline="",encoding="utf-8") as fc:
+        wo=csv.writer(fo); wc=csv.writer(fc)
+        wo.writerow(CSV_HEADER); wc.writerow(CAJA_HEADER)
+        for i,n in enumerate(por_dia):
+            d=primero+timedelta(days=i)
+            saldo+=FONDO
+            wc.writerow([f"{d} 08:30:00","FONDO_INICIAL","-",f"{FONDO:.2f}","0.00","Fondo apertura",f"{saldo:.2f}"]); movs+=1
+            stamps=sorted(datetime(d.year,d.month,d.day,h,rng.randrange(60),rng.randrange(60))
+                          for h in rng.choices(horas,weights=pesos_h,k=n))
+            for ts in stamps:
+                oid+=1
+                lineas=_items(rng,nombres,pesos)
+                total=round(sum(it.importe for it in lineas),2)
+                metodo=rng.choices([m for m,_ in PAGOS],weights=[p for _,p in PAGOS])[0]
+                ef=tj=cambio=0.0
+                if metodo=="Efectivo":
+                    ef=_billete(total); cambio=round(ef-total,2)
+                elif metodo=="Tarjeta":
+                    tj=total
+                else:
+                    tj=round(total*rng.choice((0.3,0.5,0.7)),2); ef=_billete(total-tj); cambio=round(ef-(total-tj),2)
+                estado="Pendiente" if d==hoy and rng.random()<0.3 else "Entregado"
+                sts=ts.strftime("%Y-%m-%d %H:%M:%S")
+                wo.writerow([oid,"",rng.randint(1,20),", ".join(it.name for it in lineas for _ in range(it.qty)),f"{total:.2f}",sts,
+                             estado,"sin cebolla" if rng.random()<0.05 else "",metodo,f"{ef:.2f}",f"{tj:.2f}",f"{cambio:.2f}","0.00",1,encode_items(lineas)])
+                if ef>0:
+                    saldo+=ef; wc.writerow([sts,"VENTA",oid,f"{ef:.2f}","0.00","Venta registrada",f"{saldo:.2f}"]); movs+=1
+                if cambio>0:
+                    saldo-=cambio; wc.writerow([sts,"CAMBIO",oid,"0.00",f"{cambio:.2f}","Cambio entregado",f"{saldo:.2f}"]); movs+=1
+    with open(os.path.join(carpeta,SCHEMA_FILE),"w",encoding="utf-8") as f:
+        json.dump({"version":SCHEMA_VERSION,"migraciones":[]},f)
+    return {"pedidos":oid,"movimientos_caja":movs,"dias":dias,"desde":str(primero),"hasta":str(hoy),
+            "bytes_comandas":os.path.getsize(os.path.join(carpeta,CSV_FILE)),"bytes_caja":os.path.getsize(os.path.join(carpeta,CAJA_FILE))}
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pedidos",type=int,default=1000)
+    ap.add_argument("--meses",type=int,default=6)
+    ap.add_argument("--seed",type=int,default=1)
+    ap.add_argument("--dir",required=True)
+    args=ap.parse_args()
+    print(json.dumps(generar(args.dir,args.pedidos,args.meses,args.seed),ensure_ascii=False,indent=2))
+
+if __name__=="__main__":
+    main()
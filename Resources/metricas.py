@@ -0,0 +1,145 @@
+from __future__ import annotations
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+METRICS_FILE = "comandas_metricas.jsonl"
+METRICS_MAX_BYTES = 1_000_000
+METRICS_BACKUPS = 3
+
+# Histograma logarítmico: 4 cubetas por cada duplicación (~19% de ancho), de 10 µs a varios minutos.
+_BASE_MS = 0.01
+_POR_DOBLE = 4
+_CUBETAS = 100
+
+def _cubeta(ms:float)->int:
+    if ms<=_BASE_MS: return 0
+    return min(_CUBETAS-1,int(math.log2(ms/_BASE_MS)*_POR_DOBLE)+1)
+
+def _limite(i:int)->float:
+    return _BASE_MS*2**(i/_POR_DOBLE)
+
+class OpStats:
+    __slots__=("cuenta","errores","total_ms","max_ms","filas","bytes","cubetas")
+
+    def __init__(self):
+        self.cuenta=0; self.errores=0; self.total_ms=0.0; self.max_ms=0.0
+        self.filas=0; self.bytes=0; self.cubetas=[0]*_CUBETAS
+
+    def add(self,ms:float,filas:int=0,bytes_:int=0,error:bool=False):
+        self.cuenta+=1; self.total_ms+=ms; self.filas+=filas; self.bytes+=bytes_
+        if error: self.errores+=1
+        if ms>self.max_ms: self.max_ms=ms
+        self.cubetas[_cubeta(ms)]+=1
+
+    def percentil(self,p:float)->float:
+        if not self.cuenta: return 0.0
+        objetivo=p*self.cuenta; acum=0
+        for i,c in enumerate(self.cubetas):
+            acum+=c
+            if acum>=objetivo: return min(_limite(i),self.max_ms)
+        return self.max_ms
+
+    def resumen(self)->Dict:
+        return {
+            "n":self.cuenta,"p50_ms":round(self.percentil(0.5),3),"p95_ms":round(self.percentil(0.95),3),
+            "max_ms":round(self.max_ms,3),"media_ms":round(self.total_ms/self.cuenta,3) if self.cuenta else 0.0,
+            "filas":self.filas,"bytes":self.bytes,"errores":self.errores,
+        }
+
+class Metrics:
+    def __init__(self):
+        self._lock=threading.Lock()
+        self._local=threading.local()
+        self.inicio=time.time()
+        self.total:Dict[str,OpStats]={}
+        # Lo acumulado desde el último volcado al archivo: cada línea cubre solo su intervalo.
+        self.ventana:Dict[str,OpStats]={}
+
+    def registrar(self,nombre:str,ms:float,filas:int=0,bytes_:int=0,error:bool=False):
+        with self._lock:
+            for d in (self.total,self.ventana):
+                st=d.get(nombre)
+                if st is None: st=d[nombre]=OpStats()
+                st.add(ms,filas,bytes_,error)
+
+    def registrar_desde(self,nombre:str,t0:float):
+        self.registrar(nombre,(time.perf_counter()-t0)*1000)
+
+    def contar(self,filas:int=0,bytes_:int=0):
+        # Se atribuye a todas las mediciones abiertas en este hilo (la operación y las que la contienen).
+        for m in getattr(self._local,"pila",()):
+            m[0]+=filas; m[1]+=bytes_
+
+    @contextmanager
+    def medir(self,nombre:str):
+        pila=getattr(self._local,"pila",None)
+        if pila is None: pila=self._local.pila=[]
+        m=[0,0]; pila.append(m)
+        t0=time.perf_counter(); error=False
+        try:
+            yield
+        except BaseException:
+            error=True; raise
+        finally:
+            pila.pop()
+            self.registrar(nombre,(time.perf_counter()-t0)*1000,m[0],m[1],error)
+
+    def resumen(self)->Dict[str,Dict]:
+        with self._lock:
+            return {k:v.resumen() for k,v in sorted(self.total.items())}
+
+    def reiniciar(self):
+        with self._lock:
+            self.total={}; self.ventana={}; self.inicio=time.time()
+
+    def volcar(self,path:str=METRICS_FILE):
+        with self._lock:
+            ventana,self.ventana=self.ventana,{}
+        if not ventana: return
+        linea={"fecha":datetime.now().strftime("%Y-%m-%d %H:%M:%S"),"pid":os.getpid(),
+               "ops":{k:v.resumen() for k,v in sorted(ventana.items())}}
+        try:
+            _rotar(path)
+            with open(path,"a",encoding="utf-8") as f:
+                f.write(json.dumps(linea,ensure_ascii=False)+"\n")
+        except OSError:
+            pass
+
+def _rotar(path:str):
+    try:
+        if os.path.getsize(path)<METRICS_MAX_BYTES: return
+    except OSError:
+        return
+    for i in range(METRICS_BACKUPS-1,0,-1):
+        if os.path.exists(f"{path}.{i}"): os.replace(f"{path}.{i}",f"{path}.{i+1}")
+    os.replace(path,f"{path}.1")
+
+def leer_historial(path:str=METRICS_FILE)->List[Dict]:
+    out=[]
+    for p in [f"{path}.{i}" for i in range(METRICS_BACKUPS,0,-1)]+[path]:
+        try:
+            with open(p,"r",encoding="utf-8") as f:
+                for line in f:
+                    try: out.append(json.loads(line))
+                    except ValueError: pass
+        except OSError:
+            pass
+    return out
+
+# Se crea al importar: el hilo de almacenamiento y el de la interfaz registran desde el inicio.
+_METRICS=Metrics()
+
+def metricas()->Metrics:
+    return _METRICS
+
+def medir(nombre:str):
+    return metricas().medir(nombre)
+
+def contar(filas:int=0,bytes_:int=0):
+    metricas().contar(filas,bytes_)
@@ -0,0 +1,247 @@
+from __future__ import annotations
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import Qt, QAbstractListModel, QEvent, QModelIndex, QRect, QRectF, QSize, QSortFilterProxyModel, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QFontMetrics, QPainter, QPalette, QPen
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate
+
+from pedido import Order, OrderStatus, cents_str, items_text
+
+ORDER_ROLE = Qt.ItemDataRole.UserRole
+ID_ROLE = Qt.ItemDataRole.UserRole+1
+
+class PedidosModel(QAbstractListModel):
+    def __init__(self,parent=None):
+        super().__init__(parent)
+        self.orders:List[Order]=[]
+        self._fila:Dict[int,int]={}
+
+    def rowCount(self,parent:QModelIndex=QModelIndex())->int:
+        return 0 if parent.isValid() else len(self.orders)
+
+    def data(self,index:QModelIndex,role:int=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row()>=len(self.orders): return None
+        o=self.orders[index.row()]
+        if role==ORDER_ROLE: return o
+        if role==ID_ROLE: return o.id
+        if role==Qt.ItemDataRole.DisplayRole:
+            nota=" • Nota" if o.comentarios.strip() else ""
+            return f"ID: {o.id} | Mesa: {o.mesa} | Total: ${cents_str(o.total)} | Estado: {o.estado} | {o.ts}{nota}"
+        return None
+
+    def order(self,row:int)->Order:
+        return self.orders[row]
+
+    def fila(self,order_id:int)->Optional[int]:
+        return self._fila.get(order_id)
+
+    def actualizar(self,orders:List[Order]):
+        # Cambios por fila: las vistas conservan desplazamiento y solo repintan lo que cambió.
+        nuevos={o.id for o in orders}
+        if not self.orders or not nuevos:
+            self.beginResetModel(); self.orders=list(orders); self.endResetModel()
+            self._reindexar(); return
+        for row in range(len(self.orders)-1,-1,-1):
+            if self.orders[row].id not in nuevos:
+                self.beginRemoveRows(QModelIndex(),row,row); del self.orders[row]; self.endRemoveRows()
+        previos={o.id for o in self.orders}
+        if [o.id for o in orders if o.id in previos]!=[o.id for o in self.orders]:
+            # Un pedido cambió de lugar (p. ej. se editó su hora): se rehace la lista completa.
+            self.beginResetModel(); self.orders=list(orders); self.endResetModel()
+            self._reindexar(); return
+        for i,o in enumerate(orders):
+            if i<len(self.orders) and self.orders[i].id==o.id:
+                if self.orders[i]!=o:
+                    self.orders[i]=o
+                    idx=self.index(i); self.dataChanged.emit(idx,idx)
+            else:
+                self.beginInsertRows(QModelIndex(),i,i); self.orders.insert(i,o); self.endInsertRows()
+        self._reindexar()
+
+    def actualizar_pedido(self,order_id:int,o:Optional[Order],day:Optional[str]=None):
+        # Un solo pedido (guardado o aviso de otra estación): si sigue en su lugar solo cambia su fila;
+        # si cambió de hora o de día, sale y vuelve a entrar en orden.
+        row=self._fila.get(order_id)
+        queda=o is not None and (day is None or o.day==day)
+        if row is not None:
+            if queda and (row==0 or self.orders[row-1].sort_key<=o.sort_key) and (row==len(self.orders)-1 or o.sort_key<=self.orders[row+1].sort_key):
+                if self.orders[row]!=o:
+                    self.orders[row]=o
+                    idx=self.index(row); self.dataChanged.emit(idx,idx)
+                return
+            self.beginRemoveRows(QModelIndex(),row,row); del self.orders[row]; self.endRemoveRows()
+            self._reindexar()
+        if not queda: return
+        i=bisect_right([x.sort_key for x in self.orders],o.sort_key)
+        self.beginInsertRows(QModelIndex(),i,i); self.orders.insert(i,o); self.endInsertRows()
+        self._reindexar()
+
+    def _reindexar(self):
+        self._fila={o.id:i for i,o in enumerate(self.orders)}
+
+class FiltroEstado(QSortFilterProxyModel):
+    # Pendientes o entregados del mismo modelo; al cambiar el estado la fila pasa de una vista a la otra.
+    def __init__(self,entregados:bool,parent=None):
+        super().__init__(parent)
+        self.entregados=entregados
+
+    def filterAcceptsRow(self,row:int,parent:QModelIndex)->bool:
+        return (self.sourceModel().order(row).estado is OrderStatus.ENTREGADO)==self.entregados
+
+_MARGEN = 6
+_PADDING = 16
+_ESPACIO = 10
+_BOTON_ALTO = 44
+_RADIO = 16
+
+def _fuente(puntos:int,negrita:bool=False)->QFont:
+    f=QFont(); f.setPointSize(puntos); f.setBold(negrita)
+    return f
+
+class TarjetaPedidoDelegate(QStyledItemDelegate):
+    entregado=pyqtSignal(int)
+    ticket=pyqtSignal(object)
+    copiar=pyqtSignal(object)
+
+    # (texto, señal, color de fondo)
+    BOTONES = (("Entregado","entregado","#2e7d32"),("Ticket","ticket","#616161"),("Copiar","copiar","#616161"))
+
+    def __init__(self,parent=None):
+        super().__init__(parent)
+        self.f_titulo=_fuente(18,True); self.f_cuerpo=_fuente(16); self.f_chico=_fuente(14); self.f_boton=_fuente(14,True)
+        self.tamano=QSize(360,260)
+        self._presionado:Optional[Tuple[int,str]]=None
+        self._altos:Dict[Tuple[int,int],int]={}
+        self._ancho_altos=0
+
+    def _bloques(self,o:Order)->List[Tuple[QFont,str,bool]]:
+        # (fuente, texto, ajustar a varias líneas) en el orden en que se pintan.
+        comentarios=o.comentarios if o.comentarios.strip() else "(sin comentarios)"
+        return [
+            (self.f_titulo,f"ID #{o.id}  |  Mesa {o.mesa}",False),
+            (self.f_cuerpo,f"Mesa: {o.mesa}",False),
+            (self.f_cuerpo,"Productos:\n"+items_text(o.items),True),
+            (self.f_cuerpo,f"Comentarios: {comentarios}",True),
+            (self.f_chico,f"Método: {o.metodo_pago or '-'} • Efectivo: ${cents_str(o.efectivo)} • Tarjeta: ${cents_str(o.tarjeta)} • Cambio: ${cents_str(o.cambio)} • Restante: ${cents_str(o.restante)}",True),
+            (self.f_chico,f"Total: ${cents_str(o.total)}   •   {o.estado}   •   {o.ts}",True),
+        ]
+
+    def _alto_texto(self,fuente:QFont,texto:str,ajustar:bool,ancho:int)->int:
+        fm=QFontMetrics(fuente)
+        if not ajustar: return fm.height()
+        return fm.boundingRect(QRect(0,0,ancho,100_000),int(Qt.TextFlag.TextWordWrap),texto).height()
+
+    def alto_necesario(self,o:Order,ancho:int)->int:
+        # Se memoriza por pedido y versión: un refresco sin cambios no vuelve a medir texto.
+        if ancho!=self._ancho_altos: self._altos={}; self._ancho_altos=ancho
+        clave=(o.id,o.version)
+        alto=self._altos.get(clave)
+        if alto is None:
+            interior=ancho-2*(_MARGEN+_PADDING)
+            bloques=self._bloques(o)
+            alto=2*(_MARGEN+_PADDING)+sum(self._alto_texto(f,t,a,interior) for f,t,a in bloques)
+            alto+=_ESPACIO*len(bloques)+_BOTON_ALTO
+            self._altos[clave]=alto
+        return alto
+
+    def sizeHint(self,option,index:QModelIndex)->QSize:
+        return self.tamano
+
+    def _botones(self,rect:QRect)->List[Tuple[str,str,str,QRect]]:
+        interior=rect.adjusted(_MARGEN+_PADDING,_MARGEN+_PADDING,-(_MARGEN+_PADDING),-(_MARGEN+_PADDING))
+        n=len(self.BOTONES); sep=8
+        ancho=(interior.width()-sep*(n-1))//n
+        y=interior.bottom()-_BOTON_ALTO+1
+        return [(t,s,c,QRect(interior.left()+i*(ancho+sep),y,ancho,_BOTON_ALTO)) for i,(t,s,c) in enumerate(self.BOTONES)]
+
+    def paint(self,painter:QPainter,option,index:QModelIndex):
+        o:Order=index.data(ORDER_ROLE)
+        if o is None: return
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        tarjeta=QRectF(option.rect.adjusted(_MARGEN,_MARGEN,-_MARGEN,-_MARGEN)).adjusted(1,1,-1,-1)
+        painter.setPen(QPen(QColor("#444"),2)); painter.setBrush(QColor("#222"))
+        painter.drawRoundedRect(tarjeta,_RADIO,_RADIO)
+        interior=option.rect.adjusted(_MARGEN+_PADDING,_MARGEN+_PADDING,-(_MARGEN+_PADDING),-(_MARGEN+_PADDING))
+        botones=self._botones(option.rect)
+        limite=botones[0][3].top()-_ESPACIO
+        painter.setPen(QColor("#fff"))
+        y=interior.top()
+        for fuente,texto,ajustar in self._bloques(o):
+            if y>=limite: break
+            painter.setFont(fuente)
+            alto=min(self._alto_texto(fuente,texto,ajustar,interior.width()),limite-y)
+            flags=int(Qt.AlignmentFlag.AlignLeft|Qt.AlignmentFlag.AlignTop)|(int(Qt.TextFlag.TextWordWrap) if ajustar else 0)
+            painter.drawText(QRect(interior.left(),y,interior.width(),alto),flags,texto)
+            y+=alto+_ESPACIO
+        painter.setFont(self.f_boton)
+        for texto,senal,color,r in botones:
+            fondo=QColor(color)
+            if self._presionado==(o.id,senal): fondo=fondo.darker(130)
+            painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(fondo)
+            painter.drawRoundedRect(QRectF(r),12,12)
+            painter.setPen(QColor("#fff"))
+            painter.drawText(r,int(Qt.AlignmentFlag.AlignCenter),texto)
+        painter.restore()
+
+    def editorEvent(self,event,model,option,index:QModelIndex)->bool:
+        # Los botones son solo dibujo: el clic se resuelve por posición dentro de la tarjeta.
+        tipo=event.type()
+        if tipo not in (QEvent.Type.MouseButtonPress,QEvent.Type.MouseButtonRelease,QEvent.Type.MouseButtonDblClick): return False
+        if event.button()!=Qt.MouseButton.LeftButton: return False
+        o:Order=index.data(ORDER_ROLE)
+        pos=event.position().toPoint()
+        senal=next((s for _,s,_,r in self._botones(option.rect) if r.contains(pos)),None)
+        if tipo==QEvent.Type.MouseButtonRelease:
+            presionado,self._presionado=self._presionado,None
+            if senal is not None and presionado==(o.id,senal):
+                if senal=="entregado": self.entregado.emit(o.id)
+                else: getattr(self,senal).emit(o)
+            return presionado is not None
+        if senal is None: return False
+        self._presionado=(o.id,senal)
+        return True
+
+class TableroPedidos(QListView):
+    # Cuadrícula virtual: solo se pintan las tarjetas visibles y los widgets no crecen con los pedidos.
+    def __init__(self,model:PedidosModel,parent=None):
+        super().__init__(parent)
+        self.columnas=2
+        self.vacio="Sin pedidos para mostrar en ese día."
+        self.delegate=TarjetaPedidoDelegate(self)
+        self.setModel(model); self.setItemDelegate(self.delegate)
+        self.setViewMode(QListView.ViewMode.ListMode); self.setFlow(QListView.Flow.LeftToRight); self.setWrapping(True)
+        self.setResizeMode(QListView.ResizeMode.Adjust); self.setUniformItemSizes(True)
+        self.setMovement(QListView.Movement.Static)
+        self.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.verticalScrollBar().setSingleStep(24)
+        self.setStyleSheet("QListView { background: transparent; border: none; }")
+        for s in (model.modelReset,model.rowsInserted,model.rowsRemoved,model.dataChanged):
+            s.connect(lambda *_: self._ajustar())
+
+    def set_columnas(self,columnas:int):
+        if columnas!=self.columnas:
+            self.columnas=columnas; self._ajustar()
+
+    def _ajustar(self):
+        # Todas las celdas miden lo que la tarjeta más alta, como en una cuadrícula de filas.
+        ancho=max(360,(self.viewport().width()-4)//self.columnas)
+        model=self.model()
+        alto=max([260]+[self.delegate.alto_necesario(model.order(i),ancho) for i in range(model.rowCount())])
+        tam=QSize(ancho,alto)
+        if tam!=self.delegate.tamano:
+            self.delegate.tamano=tam; self.setGridSize(tam)
+            if model.rowCount(): self.delegate.sizeHintChanged.emit(model.index(0))
+
+    def resizeEvent(self,event):
+        super().resizeEvent(event); self._ajustar()
+
+    def paintEvent(self,event):
+        super().paintEvent(event)
+        if self.model().rowCount()==0:
+            p=QPainter(self.viewport())
+            p.setPen(self.palette().color(QPalette.ColorRole.WindowText)); p.setFont(_fuente(18,True))
+            p.drawText(self.viewport().rect(),int(Qt.AlignmentFlag.AlignCenter),self.vacio)
+            p.end()
@@ -0,0 +1,191 @@
+from __future__ import annotations
+import functools
+import logging
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from catalogo import PRODUCTS, PRODUCT_IDS, PRODUCT_NAMES
+
+log=logging.getLogger(__name__)
+
+CSV_HEADER = [
+    "ID","Cliente","Número de Mesa","Productos","Total","Fecha y Hora","Estado","Comentarios",
+    "MetodoPago","EfectivoIngresado","TarjetaIngresado","Cambio","Restante","Version","Items"
+]
+VERSION_COL = CSV_HEADER.index("Version")
+ITEMS_COL = CSV_HEADER.index("Items")
+
+class OrderStatus(str,Enum):
+    PENDIENTE = "Pendiente"
+    ENTREGADO = "Entregado"
+
+    @classmethod
+    def parse(cls,txt:str)->"OrderStatus":
+        # Estados vacíos o desconocidos se trataban como pendientes en toda la interfaz.
+        return cls._value2member_map_.get(txt,cls.PENDIENTE)
+
+    def __str__(self)->str:
+        return self.value
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def parse_ts(s:str)->Optional[datetime]:
+    # Formato fijo "AAAA-MM-DD hh:mm:ss": fromisoformat es varias veces más rápido que strptime.
+    if len(s)==19:
+        try: return datetime.fromisoformat(s)
+        except ValueError: pass
+    try: return datetime.strptime(s.strip(),TS_FORMAT)
+    except ValueError: return None
+
+def to_cents(s)->int:
+    if not s: return 0
+    try: return round(float(s)*100)
+    except (TypeError,ValueError): return 0
+
+def cents_str(c:int)->str:
+    return f"{c/100:.2f}"
+
+def parse_products(items_str:str)->List[str]:
+    return [s.strip() for s in items_str.split(",") if s.strip()]
+
+class LineItem(NamedTuple):
+    name:str
+    qty:int
+    price:float
+    mods:Tuple[str,...]=()
+    # Solo en líneas que no se pudieron leer, para no perderlas al reescribir:
+    # "#id" si el producto no está en el catálogo, "=texto" si la línea entera es ilegible.
+    codigo:str=""
+
+    @property
+    def product_id(self)->Optional[int]:
+        return PRODUCT_IDS.get(self.name)
+
+    @property
+    def importe(self)->float:
+        return self.qty*self.price
+
+    def label(self)->str:
+        txt=f"{self.qty} x {self.name}" if self.qty!=1 else self.name
+        return txt+(f" ({', '.join(self.mods)})" if self.mods else "")
+
+def group_items(items)->List[LineItem]:
+    # Junta unidades iguales (mismo producto, precio y modificadores) en una sola línea.
+    out:Dict[tuple,int]={}
+    for it in items:
+        k=(it.name,round(it.price,2),tuple(it.mods),it.codigo)
+        out[k]=out.get(k,0)+it.qty
+    return [LineItem(n,q,p,m,c) for (n,p,m,c),q in out.items()]
+
+def _enc(txt:str)->str:
+    return quote(txt,safe=" ()")
+
+def encode_items(items)->str:
+    # id:cantidad:precio[:mod|mod]; los productos fuera del catálogo guardan el nombre en lugar del id.
+    parts=[]
+    for it in items:
+        if it.codigo.startswith("="):
+            parts.append(it.codigo[1:]); continue
+        pid=PRODUCT_IDS.get(it.name)
+        if it.codigo.startswith("#"): pid=it.codigo[1:]
+        tok=f"{pid if pid is not None else '~'+_enc(it.name)}:{it.qty}:{it.price:.2f}"
+        if it.mods: tok+=":"+"|".join(_enc(m) for m in it.mods)
+        parts.append(tok)
+    return ";".join(parts)
+
+@functools.lru_cache(maxsize=4096)
+def decode_items(encoded:str)->Tuple[LineItem,...]:
+    # Las líneas con un id fuera del catálogo o ilegibles se conservan como marcadores con su texto original.
+    out=[]
+    for tok in encoded.split(";"):
+        if not tok: continue
+        f=tok.split(":")
+        try:
+            if len(f)<3: raise ValueError(tok)
+            mods=tuple(unquote(m) for m in f[3].split("|")) if len(f)>3 and f[3] else ()
+            if f[0].startswith("~"):
+                out.append(LineItem(unquote(f[0][1:]),int(f[1]),float(f[2]),mods)); continue
+            name=PRODUCT_NAMES.get(int(f[0]))
+            if name is None:
+                log.warning("Producto %s fuera del catálogo en la línea %r",f[0],tok)
+                out.append(LineItem(f"Producto #{f[0]}",int(f[1]),float(f[2]),mods,"#"+f[0])); continue
+            out.append(LineItem(name,int(f[1]),float(f[2]),mods))
+        except ValueError:
+            log.warning("Línea de pedido ilegible: %r",tok)
+            out.append(LineItem(f"Línea ilegible ({tok})",1,0.0,(),"="+tok))
+    return tuple(out)
+
+@functools.lru_cache(maxsize=4096)
+def legacy_items(items_str:str)->Tuple[LineItem,...]:
+    # Pedidos anteriores a la columna Items: sin precio de venta guardado, se usa el del catálogo.
+    return tuple(group_items(LineItem(n,1,PRODUCTS.get(n,0.0) or 0.0) for n in parse_products(items_str)))
+
+def items_text(items)->str:
+    return "\n".join(it.label() for it in items)
+
+class Order:
+    # Montos en centavos; la fecha y las líneas se interpretan una sola vez al cargar.
+    __slots__=("id","cliente","mesa","items","total","fecha","estado","comentarios",
+               "metodo_pago","efectivo","tarjeta","cambio","restante","version","_ts_raw")
+
+    def __init__(self,id:int,mesa:str,items:Tuple[LineItem,...],total:int,fecha:Optional[datetime],
+                 estado:OrderStatus=OrderStatus.PENDIENTE,comentarios:str="",metodo_pago:str="",
+                 efectivo:int=0,tarjeta:int=0,cambio:int=0,restante:int=0,version:int=0,cliente:str=""):
+        self.id=id; self.cliente=cliente; self.mesa=mesa; self.items=tuple(items); self.total=total
+        self.fecha=fecha; self.estado=estado; self.comentarios=comentarios
+        self.metodo_pago=metodo_pago; self.efectivo=efectivo; self.tarjeta=tarjeta
+        self.cambio=cambio; self.restante=restante; self.version=version; self._ts_raw=""
+
+    @classmethod
+    def from_row(cls,row:List[str])->"Order":
+        if len(row)<len(CSV_HEADER): row=row+[""]*(len(CSV_HEADER)-len(row))
+        ts=row[5]; fecha=parse_ts(ts)
+        enc=row[ITEMS_COL]
+        try: version=int(row[VERSION_COL] or 0)
+        except ValueError: version=0
+        o=cls(int(row[0]),row[2],decode_items(enc) if enc else legacy_items(row[3]),to_cents(row[4]),fecha,
+              OrderStatus.parse(row[6]),row[7],row[8],to_cents(row[9]),to_cents(row[10]),
+              to_cents(row[11]),to_cents(row[12]),version,row[1])
+        # Fechas con otro formato se conservan tal cual para no perderlas al reescribir.
+        if fecha is None: o._ts_raw=ts
+        return o
+
+    def to_row(self)->List[str]:
+        return [
+            str(self.id),self.cliente,self.mesa,self.productos,cents_str(self.total),self.ts,self.estado.value,self.comentarios,
+            self.metodo_pago,cents_str(self.efectivo),cents_str(self.tarjeta),cents_str(self.cambio),cents_str(self.restante),
+            str(self.version),encode_items(self.items)
+        ]
+
+    @property
+    def ts(self)->str:
+        return self.fecha.strftime(TS_FORMAT) if self.fecha is not None else self._ts_raw
+
+    @property
+    def day(self)->str:
+        return self.fecha.date().isoformat() if self.fecha is not None else self._ts_raw[:10]
+
+    @property
+    def sort_key(self)->datetime:
+        return self.fecha or datetime.min
+
+    @property
+    def productos(self)->str:
+        # Formato anterior de la columna "Productos": un nombre por unidad.
+        return ", ".join(it.name for it in self.items for _ in range(it.qty))
+
+    def replace(self,**cambios)->"Order":
+        o=Order.__new__(Order)
+        for k in Order.__slots__: setattr(o,k,cambios.get(k,getattr(self,k)))
+        return o
+
+    def __eq__(self,other)->bool:
+        if not isinstance(other,Order): return NotImplemented
+        return all(getattr(self,k)==getattr(other,k) for k in Order.__slots__)
+
+    __hash__=None
+
+    def __repr__(self)->str:
+        return f"Order(id={self.id}, mesa={self.mesa!r}, total={cents_str(self.total)}, estado={self.estado.value}, v{self.version})"
@@ -0,0 +1,1019 @@
+from __future__ import annotations
+import csv
+import functools
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import List, Dict, Optional, Set, Tuple
+
+from archivo import Archivo, archivo, dias_archivables, inicio_periodo
+from metricas import medir, contar
+from pedido import (
+    CSV_HEADER, VERSION_COL, ITEMS_COL, Order, OrderStatus, LineItem,
+    group_items, encode_items, decode_items, items_text, parse_products, parse_ts, to_cents, cents_str
+)
+
+CSV_FILE = "comandas_estado.csv"
+JOURNAL_FILE = "comandas_journal.csv"
+SEQ_FILE = "comandas_seq.txt"
+CAJA_FILE = "caja_movimientos.csv"
+CONFIG_FILE = "config_caja.json"
+DB_FILE = "comandas.db"
+CORTES_FILE = "cortes.json"
+ROLLUP_FILE = "ventas_rollup.json"
+SCHEMA_FILE = "comandas_esquema.json"
+CAJA_INDEX_FILE = "caja_indice.json"
+TXN_FILE = "comandas_transaccion.json"
+
+# El journal se compacta sobre CSV_FILE al superar este tamaño.
+JOURNAL_MAX_BYTES = 256*1024
+
+CAJA_HEADER = [
+    "Timestamp","Tipo","OrderID","IngresoEfectivo","EgresoEfectivo","Nota","SaldoCaja"
+]
+# Los movimientos que van uno por venta no se indexan por tipo: el rango del día ya los acota.
+CAJA_TIPOS_POR_VENTA = {"VENTA","CAMBIO","VENTA_ACT","CAMBIO_ACT"}
+# El índice se guarda en disco cada tantos movimientos nuevos; lo que falte se indexa al abrir.
+CAJA_INDEX_SAVE_EVERY = 50
+
+EV_CREATE = "C"
+EV_UPDATE = "U"
+EV_STATUS = "S"
+
+class OrderConflictError(Exception):
+    def __init__(self,order_id:int,version:Optional[int]):
+        self.order_id=order_id; self.version=version
+        if version is None: msg=f"El pedido {order_id} no existe."
+        else: msg=f"El pedido {order_id} fue modificado en otra estación (versión {version}). Vuelve a cargarlo."
+        super().__init__(msg)
+
+class OrderArchivedError(Exception):
+    def __init__(self,order_id:int):
+        self.order_id=order_id
+        super().__init__(f"El pedido {order_id} es de un día cerrado y ya está archivado; no se puede modificar.")
+
+# fsync de cada escritura; con "fsync": false en config_caja.json solo se vacía el búfer al sistema.
+_FSYNC=True
+_GRUPO=threading.local()
+
+def _en_grupo()->bool:
+    return getattr(_GRUPO,"pendientes",None) is not None
+
+def _durable(f):
+    f.flush()
+    if not _FSYNC: return
+    if _en_grupo(): _GRUPO.pendientes.add(os.path.abspath(f.name))
+    else: os.fsync(f.fileno())
+
+@contextmanager
+def _grupo_archivos():
+    # Dentro del grupo cada escritura llega al sistema operativo y el fsync de cada archivo
+    # tocado se hace una sola vez al salir: pedido + VENTA + CAMBIO cuestan un vaciado a disco.
+    if _en_grupo():
+        yield; return
+    _GRUPO.pendientes=set()
+    try:
+        yield
+    finally:
+        pendientes,_GRUPO.pendientes=_GRUPO.pendientes,None
+        _vaciar(pendientes)
+
+def _vaciar(paths):
+    for path in paths:
+        try: fd=os.open(path,os.O_RDWR)
+        except OSError: continue
+        try: os.fsync(fd)
+        finally: os.close(fd)
+
+def _vaciar_grupo():
+    # Adelanta el vaciado de lo escrito hasta aquí sin cerrar el grupo (p. ej. antes de borrar la intención).
+    if _en_grupo():
+        pendientes,_GRUPO.pendientes=_GRUPO.pendientes,set()
+        _vaciar(pendientes)
+
+def _fsync_dir(path:str):
+    # Un os.replace solo sobrevive a un corte cuando la carpeta también llegó a disco.
+    if os.name=="nt": return
+    fd=os.open(os.path.dirname(os.path.abspath(path)),os.O_RDONLY)
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+def _escribir_atomico(path:str,escribir,durable:bool=True):
+    # Nunca se reescribe en su lugar: un corte a la mitad deja el archivo anterior intacto.
+    # El temporal es de cada proceso: dos estaciones que escriben a la vez no se pisan el archivo.
+    tmp=f"{path}.{os.getpid()}.tmp"
+    with open(tmp,"w",newline="",encoding="utf-8") as f:
+        escribir(f); f.flush()
+        if _FSYNC and durable: os.fsync(f.fileno())
+    os.replace(tmp,path)
+    if _FSYNC and durable: _fsync_dir(path)
+
+def _csv_bytes(rows:List[List[str]])->bytes:
+    buf=io.StringIO(newline=""); csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+def _anexar(path:str,desde:int,data:bytes)->bool:
+    # Deja el archivo como sus primeros `desde` bytes + data; repetirlo no duplica nada.
+    with open(path,"a+b") as f:
+        fin=f.seek(0,2)
+        if fin<desde: desde=fin
+        f.seek(desde)
+        if f.read(len(data))==data: return False
+        if fin>desde: f.truncate(desde)
+        f.write(data); _durable(f)
+    return True
+
+def _aplicar_transaccion(partes:List[Tuple[str,int,bytes]]):
+    # Primero la intención completa en disco; después los anexos. Si algo se corta en medio,
+    # _recuperar_transaccion repite los anexos desde la intención: quedan todos o ninguno.
+    # Dentro de un grupo los anexos se vacían juntos, pero siempre antes de borrar la intención.
+    _escribir_atomico(TXN_FILE,lambda f: json.dump([[p,d,b.decode("utf-8")] for p,d,b in partes],f,ensure_ascii=False))
+    for path,desde,data in partes: _anexar(path,desde,data)
+    _vaciar_grupo()
+    os.remove(TXN_FILE)
+
+def _recuperar_transaccion()->bool:
+    # Con los candados del journal y de la caja tomados.
+    try:
+        with open(TXN_FILE,"r",encoding="utf-8") as f:
+            partes=json.load(f)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        # La intención se escribe con reemplazo atómico; ilegible solo si se dañó por fuera.
+        os.remove(TXN_FILE); return False
+    cambio=False
+    for path,desde,texto in partes:
+        cambio=_anexar(path,desde,texto.encode("utf-8")) or cambio
+    _vaciar_grupo()
+    os.remove(TXN_FILE)
+    if cambio:
+        # Lo que este proceso tenía en memoria pudo incluir la parte cortada.
+        if _STORE is not None: _STORE._base_sig=None
+        if _LEDGER is not None: _LEDGER.invalidar()
+    return cambio
+
+def _recuperar_pendiente():
+    # Con el candado del journal tomado; el de caja va después, en el mismo orden que guardar_pedido.
+    if os.path.exists(TXN_FILE):
+        with file_lock(CAJA_FILE): _recuperar_transaccion()
+
+def ensure_csv():
+    if not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE)==0:
+        _escribir_atomico(CSV_FILE,lambda f: csv.writer(f).writerow(CSV_HEADER))
+
+# Cada versión del esquema agrega columnas al final; los lectores toleran filas cortas,
+# así que migrar es solo reescribir encabezado y anchos una vez.
+MIGRACIONES = [
+    (2,"Columna Version (control de concurrencia)",["Version"]),
+    (3,"Columna Items (líneas estructuradas)",["Items"]),
+]
+SCHEMA_VERSION = MIGRACIONES[-1][0]
+
+def _leer_esquema()->Dict:
+    try:
+        with open(SCHEMA_FILE,"r",encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return {}
+
+def _guardar_esquema(esquema:Dict):
+    # Con el mismo vaciado que el CSV migrado: tras un corte, el esquema no queda atrás de los datos.
+    _escribir_atomico(SCHEMA_FILE,lambda f: json.dump(esquema,f,ensure_ascii=False,indent=1))
+
+def _leer_encabezado()->List[str]:
+    with open(CSV_FILE,"r",newline="",encoding="utf-8") as f:
+        return next(csv.reader(f),[])
+
+def _version_por_encabezado(header:List[str])->int:
+    version=1
+    for v,_,cols in MIGRACIONES:
+        if all(c in header for c in cols): version=v
+    return version
+
+def verificar_esquema():
+    # Camino rápido de cada arranque: una línea del CSV y el marcador, sin importar el tamaño del historial.
+    ensure_csv()
+    esquema=_leer_esquema()
+    if esquema.get("version")==SCHEMA_VERSION and _leer_encabezado()==CSV_HEADER: return
+    with file_lock(JOURNAL_FILE):
+        migrar_esquema()
+
+def migrar_esquema():
+    esquema=_leer_esquema()
+    header=_leer_encabezado()
+    # Si el encabezado ya es el actual solo faltaba el marcador; si no, el encabezado dice de qué versión se parte.
+    actual=SCHEMA_VERSION if header==CSV_HEADER else _version_por_encabezado(header)
+    pendientes=[(v,n) for v,n,_ in MIGRACIONES if v>actual]
+    if pendientes or header!=CSV_HEADER:
+        with open(CSV_FILE,"rb") as f:
+            rows=_parse_csv_bytes(f.read())
+        def escribir(f):
+            w=csv.writer(f); w.writerow(CSV_HEADER)
+            w.writerows(_fit_row(r) for r in rows[1:] if r)
+        _escribir_atomico(CSV_FILE,escribir)
+    hechas=esquema.get("migraciones",[])
+    ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for v,n in pendientes: hechas.append({"version":v,"nombre":n,"fecha":ts})
+    _guardar_esquema({"version":SCHEMA_VERSION,"migraciones":hechas})
+
+def ensure_caja():
+    if not os.path.exists(CAJA_FILE):
+        _escribir_atomico(CAJA_FILE,lambda f: csv.writer(f).writerow(CAJA_HEADER))
+
+class CajaLedger:
+    def __init__(self):
+        self.invalidar()
+
+    def invalidar(self):
+        # Olvida el saldo y el índice en memoria: se rehacen desde el archivo en el próximo uso.
+        self.saldo=0.0
+        self._sig:Optional[Tuple[int,int]]=None
+        # día -> rangos de bytes [inicio, fin); tipo -> día -> offsets de cada movimiento.
+        self._day_spans:Dict[str,List[List[int]]]={}
+        self._tipo_pos:Dict[str,Dict[str,List[int]]]={}
+        self._indexed_to=0
+        self._ultima=b""
+        self._sin_guardar=0
+        self._indice_leido=False
+
+    def _saldo_desde_cola(self)->float:
+        with open(CAJA_FILE,"rb") as f:
+            pos=f.seek(0,2); data=b""
+            while pos>0:
+                step=min(4096,pos); pos-=step
+                f.seek(pos); data=f.read(step)+data
+                if data.rstrip(b"\r\n").count(b"\n")>=1: break
+        contar(0,len(data))
+        lines=data.rstrip(b"\r\n").split(b"\n")
+        if len(lines)<2 and pos==0: return 0.0
+        rows=_parse_csv_bytes(lines[-1])
+        try: return float(rows[0][-1])
+        except: return 0.0
+
+    def sync(self):
+        ensure_caja()
+        sig=_file_sig(CAJA_FILE)
+        if sig!=self._sig:
+            self.saldo=self._saldo_desde_cola(); self._sig=sig
+
+    def filas(self,movs:List[Tuple[str,str,float,float,str]])->List[List[str]]:
+        # Con el candado de caja tomado: los saldos de varios movimientos se calculan en memoria.
+        self.sync()
+        ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S"); saldo=self.saldo; out=[]
+        for tipo,order_id,ingreso_ef,egreso_ef,nota in movs:
+            saldo=round(saldo+ingreso_ef-egreso_ef,2)
+            out.append([ts,tipo,order_id,f"{ingreso_ef:.2f}",f"{egreso_ef:.2f}",nota,f"{saldo:.2f}"])
+        return out
+
+    def anotar(self,filas:List[List[str]]):
+        if filas: self.saldo=float(filas[-1][-1])
+        self._sig=_file_sig(CAJA_FILE)
+        # Lo recién escrito entra al índice ya, sin esperar a la siguiente consulta.
+        if self._indice_leido: self._actualizar_indice()
+
+    def registrar(self,tipo:str, order_id:str, ingreso_ef:float, egreso_ef:float, nota:str):
+        while True:
+            if os.path.exists(TXN_FILE):
+                with file_lock(JOURNAL_FILE): _recuperar_pendiente()
+            with file_lock(CAJA_FILE):
+                # Nunca se escribe detrás de una transacción cortada: primero se completa.
+                if os.path.exists(TXN_FILE): continue
+                filas=self.filas([(tipo,order_id,ingreso_ef,egreso_ef,nota)])
+                with open(CAJA_FILE,"a",newline="",encoding="utf-8") as f:
+                    csv.writer(f).writerows(filas); _durable(f)
+                self.anotar(filas)
+                return
+
+    def _leer_indice(self):
+        self._indice_leido=True
+        try:
+            with open(CAJA_INDEX_FILE,"r",encoding="utf-8") as f:
+                data=json.load(f)
+            hasta=int(data["hasta"]); ultima=data["ultima"].encode("utf-8")
+            # El índice solo vale si el archivo sigue teniendo la misma última línea indexada en el mismo lugar.
+            with open(CAJA_FILE,"rb") as f:
+                f.seek(max(hasta-len(ultima),0)); ok=f.read(len(ultima))==ultima
+        except:
+            return
+        if not ok: return
+        self._day_spans=data["dias"]; self._tipo_pos=data["tipos"]
+        self._indexed_to=hasta; self._ultima=ultima
+
+    def _guardar_indice(self):
+        data={"hasta":self._indexed_to,"ultima":self._ultima.decode("utf-8","replace"),
+              "dias":self._day_spans,"tipos":self._tipo_pos}
+        tmp=f"{CAJA_INDEX_FILE}.{os.getpid()}.tmp"
+        try:
+            with open(tmp,"w",encoding="utf-8") as f:
+                json.dump(data,f,ensure_ascii=False)
+            os.replace(tmp,CAJA_INDEX_FILE)
+        except OSError:
+            pass
+        self._sin_guardar=0
+
+    def _index_tail(self):
+        with open(CAJA_FILE,"rb") as f:
+            pos=inicio=self._indexed_to; f.seek(pos)
+            for line in f:
+                if not line.endswith(b"\n"): break
+                nxt=pos+len(line)
+                if pos>0:
+                    day=line[:10].decode("utf-8","replace")
+                    spans=self._day_spans.setdefault(day,[])
+                    if spans and spans[-1][1]==pos: spans[-1][1]=nxt
+                    else: spans.append([pos,nxt])
+                    partes=line.split(b",",2)
+                    tipo=partes[1].decode("utf-8","replace") if len(partes)>2 else ""
+                    if tipo not in CAJA_TIPOS_POR_VENTA:
+                        self._tipo_pos.setdefault(tipo,{}).setdefault(day,[]).append(pos)
+                pos=nxt; self._ultima=line; self._sin_guardar+=1
+        contar(0,pos-inicio)
+        self._indexed_to=pos
+        if self._sin_guardar>=CAJA_INDEX_SAVE_EVERY: self._guardar_indice()
+
+    def _actualizar_indice(self):
+        ensure_caja()
+        if not self._indice_leido: self._leer_indice()
+        sig=_file_sig(CAJA_FILE)
+        size=sig[1] if sig else 0
+        if size<self._indexed_to: self._day_spans={}; self._tipo_pos={}; self._indexed_to=0
+        if size>self._indexed_to: self._index_tail()
+
+    def reconstruir_indice(self):
+        self._day_spans={}; self._tipo_pos={}; self._indexed_to=0; self._indice_leido=True
+        self._actualizar_indice(); self._guardar_indice()
+
+    def tiene_movimiento(self,fecha:str,tipo:str)->bool:
+        self._actualizar_indice()
+        if tipo in CAJA_TIPOS_POR_VENTA:
+            return any(len(r)>1 and r[1]==tipo for r in self.movimientos_dia(fecha))
+        return bool(self._tipo_pos.get(tipo,{}).get(fecha))
+
+    def movimientos_dia(self,fecha:str)->List[List[str]]:
+        self._actualizar_indice()
+        rows:List[List[str]]=[]
+        with open(CAJA_FILE,"rb") as f:
+            for a,b in self._day_spans.get(fecha,()):
+                f.seek(a); rows.extend(_parse_csv_bytes(f.read(b-a)))
+                contar(0,b-a)
+        contar(len(rows))
+        return rows
+
+    def recalcular(self)->float:
+        ensure_caja()
+        saldo=0.0
+        with open(CAJA_FILE,"r",newline="",encoding="utf-8") as f:
+            rows=csv.reader(f); next(rows,None); n=0
+            for r in rows:
+                n+=1
+                try: saldo+=float(r[3] or 0.0)-float(r[4] or 0.0)
+                except: pass
+            contar(n,f.tell())
+        return round(saldo,2)
+
+_LEDGER:Optional[CajaLedger]=None
+
+def caja_ledger()->CajaLedger:
+    global _LEDGER
+    if _LEDGER is None: _LEDGER=CajaLedger()
+    return _LEDGER
+
+def _fit_row(r:List[str])->List[str]:
+    if len(r)<len(CSV_HEADER): return r+[""]*(len(CSV_HEADER)-len(r))
+    if len(r)>len(CSV_HEADER): return r[:len(CSV_HEADER)]
+    return r
+
+def _order_key(oid)->Optional[int]:
+    try: return int(oid)
+    except: return None
+
+def _apply_event(rows:List[Order], index:Dict[int,int], ev:List[str])->Optional[int]:
+    if not ev: return None
+    op=ev[0]
+    if op in (EV_CREATE,EV_UPDATE):
+        if _order_key(ev[1] if len(ev)>1 else None) is None: return None
+        o=Order.from_row(ev[1:])
+        i=index.get(o.id)
+        if i is None:
+            index[o.id]=len(rows); rows.append(o)
+        else:
+            rows[i]=o
+        return o.id
+    elif op==EV_STATUS and len(ev)>=3:
+        i=index.get(_order_key(ev[1]))
+        if i is not None:
+            # Se reemplaza el pedido para que las copias entregadas no cambien por debajo.
+            o=rows[i]; rows[i]=o.replace(estado=OrderStatus.parse(ev[2]),version=o.version+1)
+    return None
+
+def _file_sig(path:str)->Optional[Tuple[int,int]]:
+    try: st=os.stat(path)
+    except OSError: return None
+    return (st.st_mtime_ns,st.st_size)
+
+def _parse_csv_bytes(data:bytes)->List[List[str]]:
+    return list(csv.reader(io.StringIO(data.decode("utf-8"),newline="")))
+
+def row_contrib(order:Order)->Dict[str,List[float]]:
+    out:Dict[str,List[float]]={}
+    for it in order.items:
+        c=out.setdefault(it.name,[0,0.0])
+        c[0]+=it.qty; c[1]+=it.qty*it.price
+    return out
+
+class SalesRollup:
+    def __init__(self):
+        # dia -> producto -> [cantidad, importe, {ids de ticket}]
+        self.dias:Dict[str,Dict[str,list]]={}
+
+    def add(self,order:Order,sign:int=1):
+        day=order.day; tid=str(order.id)
+        prods=self.dias.setdefault(day,{})
+        for name,(qty,amount) in row_contrib(order).items():
+            c=prods.setdefault(name,[0,0.0,set()])
+            c[0]+=sign*qty; c[1]+=sign*amount
+            if sign>0: c[2].add(tid)
+            else: c[2].discard(tid)
+            if c[0]<=0: del prods[name]
+        if not prods: del self.dias[day]
+
+    def rebuild(self,orders:List[Order]):
+        self.dias={}
+        for o in orders: self.add(o)
+
+    def query(self,desde:Optional[str],hasta:Optional[str],excluir:Set[str]=frozenset())->List[Tuple[str,int,float,int]]:
+        acc:Dict[str,list]={}
+        for day,prods in self.dias.items():
+            if (desde and day<desde) or (hasta and day>hasta) or day in excluir: continue
+            contar(len(prods))
+            for name,(qty,amount,tickets) in prods.items():
+                a=acc.setdefault(name,[0,0.0,set()])
+                a[0]+=qty; a[1]+=amount; a[2]|=tickets
+        return [(n,a[0],round(a[1],2),len(a[2])) for n,a in acc.items()]
+
+    def save(self,base_sig):
+        data={"base":list(base_sig) if base_sig else None,
+              "dias":{d:{n:[c[0],c[1],sorted(c[2])] for n,c in p.items()} for d,p in self.dias.items()}}
+        # Es solo un caché y a propósito no pasa por _escribir_atomico: sin fsync, porque si se pierde
+        # o queda viejo tras un corte, load() lo descarta por la firma y se reconstruye. Se escribe con
+        # el candado del journal y un temporal propio de cada proceso; si falla, la lectura sigue adelante.
+        tmp=f"{ROLLUP_FILE}.{os.getpid()}.tmp"
+        try:
+            with file_lock(JOURNAL_FILE):
+                if _file_sig(CSV_FILE)!=base_sig: return
+                with open(tmp,"w",encoding="utf-8") as f:
+                    json.dump(data,f)
+                os.replace(tmp,ROLLUP_FILE)
+        except OSError:
+            pass
+
+    def load(self,base_sig)->bool:
+        try:
+            with open(ROLLUP_FILE,"r",encoding="utf-8") as f:
+                data=json.load(f)
+        except:
+            return False
+        if not base_sig or data.get("base")!=list(base_sig): return False
+        self.dias={d:{n:[c[0],c[1],set(c[2])] for n,c in p.items()} for d,p in data.get("dias",{}).items()}
+        return True
+
+class OrderStore:
+    def __init__(self):
+        self.rows:List[Order]=[]
+        self.index:Dict[int,int]={}
+        self.version=0
+        self.max_id=0
+        self.by_day:Dict[str,set]={}
+        self.rollup=SalesRollup()
+        self._base_sig:Optional[Tuple[int,int]]=None
+        self._journal_pos=0
+
+    def _load(self):
+        if not os.path.exists(CSV_FILE): ensure_csv()
+        # Se carga sin candado: la firma sale del archivo que realmente se leyó, y si otra estación
+        # compactó mientras tanto, el journal leído ya no corresponde a ese CSV y se vuelve a cargar.
+        while True:
+            with open(CSV_FILE,"rb") as f:
+                st=os.fstat(f.fileno()); data=f.read()
+            sig=(st.st_mtime_ns,st.st_size)
+            rows=_parse_csv_bytes(data)
+            contar(len(rows)-1,len(data))
+            self.rows=[]; self.index={}; self.by_day={}
+            for r in rows[1:]:
+                if not r or _order_key(r[0]) is None: continue
+                o=Order.from_row(r)
+                self.index[o.id]=len(self.rows); self.rows.append(o)
+                self.by_day.setdefault(o.day,set()).add(o.id)
+            self.max_id=max(self.index,default=0)
+            self._base_sig=sig
+            if not self.rollup.load(sig):
+                self.rollup.rebuild(self.rows); self.rollup.save(sig)
+            self._journal_pos=0
+            self._read_journal_tail()
+            if _file_sig(CSV_FILE)==sig: break
+        self.version+=1
+
+    def _read_journal_tail(self)->bool:
+        try:
+            with open(JOURNAL_FILE,"rb") as f:
+                f.seek(self._journal_pos)
+                data=f.read()
+        except OSError:
+            return False
+        # Solo se consumen líneas completas; una escritura a medias se lee en la siguiente sincronización.
+        end=data.rfind(b"\n")+1
+        if end<=0: return False
+        evs=_parse_csv_bytes(data[:end])
+        contar(len(evs),end)
+        for ev in evs:
+            self._apply(ev)
+        self._journal_pos+=end
+        return True
+
+    def _apply(self,ev:List[str]):
+        i=self.index.get(_order_key(ev[1])) if len(ev)>1 else None
+        old=self.rows[i] if i is not None else None
+        old_day=old.day if old is not None else None
+        key=_apply_event(self.rows,self.index,ev)
+        if key is None: return
+        if key>self.max_id: self.max_id=key
+        new=self.rows[self.index[key]]
+        if old is not None: self.rollup.add(old,-1)
+        self.rollup.add(new)
+        new_day=new.day
+        if new_day!=old_day:
+            if old_day is not None: self.by_day.get(old_day,set()).discard(key)
+            self.by_day.setdefault(new_day,set()).add(key)
+
+    def sync(self):
+        if self._base_sig is None or _file_sig(CSV_FILE)!=self._base_sig:
+            self._load(); return
+        jsig=_file_sig(JOURNAL_FILE)
+        size=jsig[1] if jsig else 0
+        if size<self._journal_pos:
+            self._load()
+        elif size>self._journal_pos and self._read_journal_tail():
+            self.version+=1
+
+    def get(self,order_id:int)->Optional[Order]:
+        self.sync()
+        i=self.index.get(order_id)
+        return self.rows[i] if i is not None else None
+
+    def for_day(self,day:str)->List[Order]:
+        self.sync()
+        orders=[self.rows[self.index[k]] for k in self.by_day.get(day,())]
+        contar(len(orders))
+        orders.sort(key=lambda o: o.sort_key)
+        return orders
+
+    def all_orders(self)->List[Order]:
+        self.sync()
+        contar(len(self.rows))
+        return list(self.rows)
+
+    def preparar(self,ev:List[str],expected_version:Optional[int]=None)->List[str]:
+        # Con el candado del journal tomado: valida la versión y fija la que tendrá el evento.
+        self.sync()
+        key=_order_key(ev[1])
+        i=self.index.get(key)
+        cur=self.rows[i].version if i is not None else None
+        if ev[0]==EV_CREATE and cur is not None: raise OrderConflictError(key,cur)
+        if ev[0] in (EV_UPDATE,EV_STATUS) and cur is None: raise OrderConflictError(key,None)
+        if expected_version is not None and cur!=expected_version: raise OrderConflictError(key,cur)
+        if ev[0] in (EV_CREATE,EV_UPDATE):
+            ev=[ev[0]]+_fit_row(list(ev[1:])); ev[1+VERSION_COL]=str((cur or 0)+1)
+        return ev
+
+    def write_event(self,ev:List[str],expected_version:Optional[int]=None):
+        # El candado solo cubre sincronizar, validar la versión y anexar una línea;
+        # nadie lo retiene mientras el usuario edita un pedido.
+        with file_lock(JOURNAL_FILE):
+            _recuperar_pendiente()
+            ev=self.preparar(ev,expected_version)
+            if not os.path.exists(CSV_FILE): ensure_csv()
+            with open(JOURNAL_FILE,"a",newline="",encoding="utf-8") as f:
+                csv.writer(f).writerow(ev); _durable(f)
+            self.sync()
+            if self._journal_pos>=JOURNAL_MAX_BYTES: self._compact()
+
+    def replace(self,all_rows:List[List[str]]):
+        with file_lock(JOURNAL_FILE):
+            _recuperar_pendiente()
+            _escribir_atomico(CSV_FILE,lambda f: csv.writer(f).writerows(all_rows))
+            # all_rows es el estado completo: los eventos pendientes ya están incluidos.
+            if os.path.exists(JOURNAL_FILE): os.remove(JOURNAL_FILE)
+            self._load()
+
+    def compact(self):
+        with file_lock(JOURNAL_FILE):
+            _recuperar_pendiente(); self._compact()
+
+    def retirar(self,ids:Set[int]):
+        # Con el candado del journal tomado: el estado en memoria ya incluye el journal.
+        self.sync()
+        def escribir(f):
+            w=csv.writer(f); w.writerow(CSV_HEADER); w.writerows(o.to_row() for o in self.rows if o.id not in ids)
+        _escribir_atomico(CSV_FILE,escribir)
+        if os.path.exists(JOURNAL_FILE): os.remove(JOURNAL_FILE)
+        self._load()
+
+    def _compact(self):
+        self.sync()
+        def escribir(f):
+            w=csv.writer(f); w.writerow(CSV_HEADER); w.writerows(o.to_row() for o in self.rows)
+        # El journal solo se borra cuando el CSV nuevo ya está completo en disco.
+        _escribir_atomico(CSV_FILE,escribir)
+        if os.path.exists(JOURNAL_FILE): os.remove(JOURNAL_FILE)
+        self._base_sig=_file_sig(CSV_FILE); self._journal_pos=0
+        self.rollup.save(self._base_sig)
+
+_STORE:Optional[OrderStore]=None
+
+def order_store()->OrderStore:
+    global _STORE
+    if _STORE is None: _STORE=OrderStore()
+    return _STORE
+
+_CANDADOS=threading.local()
+
+@contextmanager
+def file_lock(path:str):
+    # flock no es reentrante entre descriptores del mismo proceso: si este hilo ya lo tiene, se reutiliza.
+    tomados=getattr(_CANDADOS,"rutas",None)
+    if tomados is None: tomados=_CANDADOS.rutas=set()
+    if path in tomados:
+        yield; return
+    tomados.add(path)
+    try:
+        with _file_lock(path): yield
+    finally:
+        tomados.discard(path)
+
+@contextmanager
+def _file_lock(path:str):
+    with open(path+".lock","a+b") as f:
+        if os.name=="nt":
+            import msvcrt
+            while True:
+                f.seek(0)
+                try: msvcrt.locking(f.fileno(),msvcrt.LK_LOCK,1); break
+                except OSError: pass
+            try: yield
+            finally:
+                f.seek(0); msvcrt.locking(f.fileno(),msvcrt.LK_UNLCK,1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(),fcntl.LOCK_EX)
+            try: yield
+            finally: fcntl.flock(f.fileno(),fcntl.LOCK_UN)
+
+def _read_seq()->Optional[int]:
+    try:
+        with open(SEQ_FILE,"r",encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError,ValueError):
+        return None
+
+def _write_seq(value:int):
+    # Sin fsync: si el contador se pierde en un corte, next_order_id lo recupera del historial,
+    # que sí llega a disco junto con el pedido.
+    _escribir_atomico(SEQ_FILE,lambda f: f.write(str(value)),durable=False)
+
+class CsvEngine:
+    nombre="csv"
+
+    def grupo(self):
+        return _grupo_archivos()
+
+    def ensure(self):
+        verificar_esquema(); ensure_caja()
+        with file_lock(JOURNAL_FILE): _recuperar_pendiente()
+
+    def read_orders(self)->List[List[str]]:
+        return [list(CSV_HEADER)]+[o.to_row() for o in order_store().all_orders()]
+
+    def all_orders(self)->List[Order]:
+        return order_store().all_orders()
+
+    def write_orders(self,all_rows:List[List[str]]):
+        order_store().replace(all_rows)
+
+    def compact(self):
+        order_store().compact()
+
+    def version(self)->int:
+        store=order_store(); store.sync()
+        return store.version
+
+    def get_order(self,order_id:int)->Optional[Order]:
+        return order_store().get(order_id)
+
+    def orders_for_day(self,day:str,estado:Optional[str]=None)->List[Order]:
+        orders=order_store().for_day(day)
+        return orders if estado is None else [o for o in orders if o.estado==estado]
+
+    def ventas_por_producto(self,desde:Optional[str],hasta:Optional[str],excluir:Set[str]=frozenset())->List[Tuple[str,int,float,int]]:
+        store=order_store(); store.sync()
+        return store.rollup.query(desde,hasta,excluir)
+
+    def append_order(self,order:Order):
+        order_store().write_event([EV_CREATE]+order.to_row())
+
+    def update_order(self,order:Order,expected_version:Optional[int]=None):
+        order_store().write_event([EV_UPDATE]+order.to_row(),expected_version)
+
+    def set_order_status(self,order_id:int,status:str,expected_version:Optional[int]=None):
+        order_store().write_event([EV_STATUS,str(order_id),status],expected_version)
+
+    def dias_activos(self)->Set[str]:
+        store=order_store(); store.sync()
+        return {d for d,ids in store.by_day.items() if ids}
+
+    def archivar(self,antes:str,forzados:Set[str],guardar)->int:
+        with file_lock(JOURNAL_FILE):
+            _recuperar_pendiente()
+            store=order_store(); store.sync()
+            orders=[o for os_ in dias_archivables(store.rows,antes,forzados).values() for o in os_]
+            if not orders: return 0
+            guardar(orders)
+            store.retirar({o.id for o in orders})
+        return len(orders)
+
+    def next_order_id(self,minimo:int=0)->int:
+        # Se sincroniza antes del candado del contador: una recarga puede tomar el del journal
+        # (caché de ventas), y guardar_pedido los toma en el orden journal -> contador.
+        store=order_store(); store.sync()
+        with file_lock(SEQ_FILE):
+            last=_read_seq()
+            # El historial manda si el contador falta o quedó atrás (p. ej. un CSV restaurado).
+            nxt=max(last or 0,store.max_id,minimo)+1
+            _write_seq(nxt)
+        return nxt
+
+    def guardar_pedido(self,order:Order,movs:List[Tuple[str,float,float,str]],nuevo:bool,expected_version:Optional[int]=None,minimo:int=0)->int:
+        with file_lock(JOURNAL_FILE),file_lock(CAJA_FILE),self.grupo():
+            _recuperar_transaccion()
+            store=order_store(); ledger=caja_ledger()
+            if nuevo: order=order.replace(id=self.next_order_id(minimo))
+            ev=store.preparar([EV_CREATE if nuevo else EV_UPDATE]+order.to_row(),expected_version)
+            filas=ledger.filas([(tipo,str(order.id),ing,eg,nota) for tipo,ing,eg,nota in movs])
+            if not os.path.exists(CSV_FILE): ensure_csv()
+            partes=[(JOURNAL_FILE,_file_sig(JOURNAL_FILE),[ev])]
+            if filas: partes.append((CAJA_FILE,_file_sig(CAJA_FILE),filas))
+            _aplicar_transaccion([(p,sig[1] if sig else 0,_csv_bytes(rows)) for p,sig,rows in partes])
+            store.sync(); ledger.anotar(filas)
+            if store._journal_pos>=JOURNAL_MAX_BYTES: store._compact()
+        return order.id
+
+    def caja_registrar(self,tipo:str,order_id:str,ingreso_ef:float,egreso_ef:float,nota:str):
+        caja_ledger().registrar(tipo,order_id,ingreso_ef,egreso_ef,nota)
+
+    def caja_saldo(self)->float:
+        ledger=caja_ledger(); ledger.sync()
+        return ledger.saldo
+
+    def caja_recalcular(self)->float:
+        # La verificación manual también rehace el índice por día desde cero.
+        ledger=caja_ledger(); ledger.reconstruir_indice()
+        return ledger.recalcular()
+
+    def caja_movimientos_dia(self,fecha:str)->List[List[str]]:
+        return caja_ledger().movimientos_dia(fecha)
+
+    def caja_tiene_movimiento(self,fecha:str,tipo:str)->bool:
+        return caja_ledger().tiene_movimiento(fecha,tipo)
+
+def load_config()->Dict:
+    if not os.path.exists(CONFIG_FILE): return {}
+    try:
+        with open(CONFIG_FILE,"r",encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return {}
+
+def save_config(cfg:Dict):
+    # Un config truncado haría caer a otro motor de almacenamiento al siguiente arranque.
+    _escribir_atomico(CONFIG_FILE,lambda f: json.dump(cfg,f))
+
+_ENGINE=None
+# El hilo de almacenamiento y el hilo de la interfaz comparten los mismos índices en memoria.
+_LOCK=threading.RLock()
+
+def _locked(fn):
+    # Cada operación pública queda medida, incluida la espera por el candado.
+    nombre="storage."+fn.__name__
+    @functools.wraps(fn)
+    def wrapper(*args,**kwargs):
+        with medir(nombre),_LOCK: return fn(*args,**kwargs)
+    return wrapper
+
+def storage_engine():
+    global _ENGINE, _FSYNC
+    if _ENGINE is None:
+        cfg=load_config()
+        _FSYNC=bool(cfg.get("fsync",True))
+        if cfg.get("almacenamiento","csv")=="sqlite":
+            from storage_sqlite import SqliteEngine
+            _ENGINE=SqliteEngine(cfg.get("sqlite_db",DB_FILE),_FSYNC)
+        else:
+            _ENGINE=CsvEngine()
+    return _ENGINE
+
+@contextmanager
+def grupo_escritura():
+    # Las escrituras de una misma operación (pedido y movimientos de caja) se confirman juntas en disco.
+    with _LOCK,storage_engine().grupo():
+        yield
+
+def _archivo()->Archivo:
+    arch=archivo(); arch.sync()
+    return arch
+
+def _periodo_archivo()->str:
+    return load_config().get("archivo_periodo","mes")
+
+@_locked
+def ensure_storage():
+    storage_engine().ensure()
+    arch=_archivo()
+    if not arch.dias: return
+    # Un archivado interrumpido después de escribir el manifiesto deja esos días también en el
+    # almacenamiento activo: se terminan de mover antes de que nadie los lea.
+    pendientes=storage_engine().dias_activos()&set(arch.dias)
+    if pendientes:
+        storage_engine().archivar("",pendientes,lambda orders: arch.guardar(orders,_periodo_archivo()))
+
+@_locked
+def read_orders()->List[List[str]]:
+    return storage_engine().read_orders()
+
+@_locked
+def write_orders(all_rows:List[List[str]]):
+    storage_engine().write_orders(all_rows)
+
+@_locked
+def compact_orders():
+    storage_engine().compact()
+
+@_locked
+def all_orders()->List[Order]:
+    arch=_archivo()
+    if not arch.dias: return storage_engine().all_orders()
+    return [o for o in storage_engine().all_orders() if o.day not in arch.dias]+arch.all_orders()
+
+@_locked
+def orders_version()->int:
+    return storage_engine().version()
+
+def _day_key(day)->str:
+    return day if isinstance(day,str) else day.strftime("%Y-%m-%d")
+
+@_locked
+def orders_for_day(day,estado:Optional[str]=None)->List[Order]:
+    day=_day_key(day)
+    arch=_archivo()
+    if day in arch.dias:
+        orders=arch.orders_for_day(day)
+        return orders if estado is None else [o for o in orders if o.estado==estado]
+    return storage_engine().orders_for_day(day,estado)
+
+@_locked
+def ventas_por_producto(desde=None,hasta=None)->List[Tuple[str,int,float,int]]:
+    desde=_day_key(desde) if desde else None; hasta=_day_key(hasta) if hasta else None
+    arch=_archivo()
+    if not arch.dias: return storage_engine().ventas_por_producto(desde,hasta)
+    acc=arch.ventas(desde,hasta)
+    for n,q,a,t in storage_engine().ventas_por_producto(desde,hasta,set(arch.dias)):
+        c=acc.setdefault(n,[0,0.0,0])
+        c[0]+=q; c[1]+=a; c[2]+=t
+    return [(n,c[0],round(c[1],2),c[2]) for n,c in acc.items() if c[0]>0]
+
+@_locked
+def get_order(order_id:int)->Optional[Order]:
+    o=storage_engine().get_order(order_id)
+    return o if o is not None else _archivo().get(order_id)
+
+@_locked
+def append_order(order:Order):
+    storage_engine().append_order(order)
+
+def _sin_archivar(order_id:int,fn,*args):
+    try: return fn(*args)
+    except OrderConflictError as e:
+        if e.version is None and _archivo().get(order_id) is not None: raise OrderArchivedError(order_id) from e
+        raise
+
+@_locked
+def update_order(order:Order, expected_version:Optional[int]=None):
+    _sin_archivar(order.id,storage_engine().update_order,order,expected_version)
+
+@_locked
+def set_order_status(order_id:int, status:str, expected_version:Optional[int]=None):
+    _sin_archivar(order_id,storage_engine().set_order_status,order_id,status,expected_version)
+
+@_locked
+def guardar_pedido(order:Order,movs:List[Tuple[str,float,float,str]]=(),expected_version:Optional[int]=None,nuevo:bool=False)->int:
+    # El pedido y sus movimientos de caja (tipo, ingreso, egreso, nota) se confirman juntos:
+    # un corte a la mitad nunca deja la caja y el pedido en desacuerdo. Con nuevo=True se asigna el ID.
+    if nuevo: return storage_engine().guardar_pedido(order,movs,True,None,_archivo().max_id)
+    return _sin_archivar(order.id,storage_engine().guardar_pedido,order,movs,False,expected_version)
+
+@_locked
+def next_order_id()->int:
+    # Los IDs archivados no se reutilizan aunque ya no estén en el almacenamiento activo.
+    return storage_engine().next_order_id(_archivo().max_id)
+
+@_locked
+def archivar_cerrados(hoy:Optional[date]=None)->int:
+    periodo=_periodo_archivo()
+    antes=inicio_periodo(hoy or date.today(),periodo)
+    arch=_archivo()
+    def guardar(orders:List[Order]):
+        # El corte de cada día queda guardado antes de mover sus pedidos.
+        for d in sorted({o.day for o in orders}): corte_dia(d)
+        arch.guardar(orders,periodo)
+    return storage_engine().archivar(antes,frozenset(),guardar)
+
+@_locked
+def caja_saldo_actual() -> float:
+    return storage_engine().caja_saldo()
+
+@_locked
+def caja_verificar_saldo()->Tuple[float,float]:
+    return caja_saldo_actual(),storage_engine().caja_recalcular()
+
+@_locked
+def caja_movimientos_dia(fecha)->List[List[str]]:
+    return storage_engine().caja_movimientos_dia(_day_key(fecha))
+
+@_locked
+def apertura_existente(fecha_str:str) -> bool:
+    return storage_engine().caja_tiene_movimiento(_day_key(fecha_str),"FONDO_INICIAL")
+
+@_locked
+def caja_registrar(tipo:str, order_id:str, ingreso_ef:float, egreso_ef:float, nota:str):
+    storage_engine().caja_registrar(tipo,order_id,ingreso_ef,egreso_ef,nota)
+
+def calcular_corte(fecha:str)->Dict[str,float]:
+    efectivo=0; tarjeta=0
+    for o in orders_for_day(fecha):
+        efectivo+=max(o.efectivo-o.cambio,0)
+        tarjeta+=o.tarjeta
+    fondo=None; dev_ef=0.0; dev_tj=0.0; ingreso=0.0; egreso=0.0
+    for r in caja_movimientos_dia(fecha):
+        try:
+            tipo=r[1]
+            ing=float(r[3] or 0.0); eg=float(r[4] or 0.0)
+            ingreso+=ing; egreso+=eg
+            if tipo=="FONDO_INICIAL" and fondo is None: fondo=ing
+            if "DEVOLUCION" in tipo and "TARJETA" not in tipo:
+                dev_ef+=eg
+            if "DEVOLUCION_TARJETA" in tipo:
+                nota=r[5] or ""
+                if "TJ=" in nota:
+                    try:
+                        dev_tj+=float(nota.split("TJ=")[1].split()[0])
+                    except:
+                        pass
+        except: pass
+    return {
+        "fondo":fondo or 0.0,"efectivo":efectivo/100,"tarjeta":tarjeta/100,
+        "dev_efectivo":round(dev_ef,2),"dev_tarjeta":round(dev_tj,2),"saldo":round(ingreso-egreso,2),
+    }
+
+_CORTES:Optional[Dict[str,Dict[str,float]]]=None
+
+def _cortes_guardados()->Dict[str,Dict[str,float]]:
+    global _CORTES
+    if _CORTES is None:
+        try:
+            with open(CORTES_FILE,"r",encoding="utf-8") as f:
+                _CORTES=json.load(f)
+        except:
+            _CORTES={}
+    return _CORTES
+
+@_locked
+def corte_dia(fecha)->Dict[str,float]:
+    global _CORTES
+    fecha=_day_key(fecha)
+    cortes=_cortes_guardados()
+    if fecha in cortes: return cortes[fecha]
+    corte=calcular_corte(fecha)
+    # Solo los días ya cerrados se guardan: el día en curso sigue recibiendo movimientos.
+    if fecha<datetime.now().strftime("%Y-%m-%d"):
+        # Otra estación pudo guardar otro corte mientras se calculaba: se relee con el candado antes de escribir.
+        with file_lock(JOURNAL_FILE):
+            _CORTES=None; cortes=_cortes_guardados()
+            if fecha in cortes: return cortes[fecha]
+            cortes[fecha]=corte
+            tmp=f"{CORTES_FILE}.{os.getpid()}.tmp"
+            with open(tmp,"w",encoding="utf-8") as f:
+                json.dump(cortes,f)
+            os.replace(tmp,CORTES_FILE)
+    return corte
@@ -0,0 +1,324 @@
+from __future__ import annotations
+import csv
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+from archivo import dias_archivables
+from metricas import contar
+from storage import (
+    CSV_FILE, JOURNAL_FILE, CAJA_FILE, CSV_HEADER, SCHEMA_VERSION, VERSION_COL, CsvEngine, Order, OrderConflictError, _fit_row, row_contrib
+)
+
+ORDER_COLS = [
+    "id","cliente","mesa","productos","total","fecha_hora","estado","comentarios",
+    "metodo_pago","efectivo","tarjeta","cambio","restante","version","items"
+]
+
+# Columnas añadidas después de la primera versión del esquema, con la versión que las introdujo.
+_NUEVAS_COLUMNAS = [(2,"version","INTEGER DEFAULT 0"),(3,"items","TEXT DEFAULT ''")]
+
+CAJA_COLS = ["ts","tipo","order_id","ingreso","egreso","nota","saldo"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comandas(
+    id INTEGER PRIMARY KEY, cliente TEXT, mesa TEXT, productos TEXT, total TEXT, fecha_hora TEXT,
+    estado TEXT, comentarios TEXT, metodo_pago TEXT, efectivo TEXT, tarjeta TEXT, cambio TEXT, restante TEXT,
+    version INTEGER DEFAULT 0, items TEXT DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_comandas_fecha ON comandas(fecha_hora);
+CREATE INDEX IF NOT EXISTS idx_comandas_estado ON comandas(estado, fecha_hora);
+CREATE INDEX IF NOT EXISTS idx_comandas_mesa ON comandas(mesa);
+CREATE TABLE IF NOT EXISTS caja(
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, tipo TEXT, order_id TEXT,
+    ingreso TEXT, egreso TEXT, nota TEXT, saldo TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_caja_ts ON caja(ts);
+CREATE INDEX IF NOT EXISTS idx_caja_tipo ON caja(tipo, ts);
+CREATE TABLE IF NOT EXISTS meta(clave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS ventas_rollup(
+    dia TEXT, producto TEXT, cantidad INTEGER, importe REAL, PRIMARY KEY(dia, producto)
+);
+CREATE TABLE IF NOT EXISTS ventas_tickets(
+    dia TEXT, producto TEXT, order_id INTEGER, PRIMARY KEY(dia, producto, order_id)
+);
+"""
+
+_SELECT_ORDERS = "SELECT "+",".join(ORDER_COLS)+" FROM comandas"
+_INSERT_ORDER = "INSERT OR REPLACE INTO comandas("+",".join(ORDER_COLS)+") VALUES ("+",".join("?"*len(ORDER_COLS))+")"
+_INSERT_CAJA = "INSERT INTO caja("+",".join(CAJA_COLS)+") VALUES ("+",".join("?"*len(CAJA_COLS))+")"
+
+def _row(r)->List[str]:
+    return ["" if v is None else str(v) for v in r]
+
+def _order(r)->Order:
+    return Order.from_row(_row(r))
+
+def _rollup_apply(con:sqlite3.Connection,order:Order,sign:int):
+    day=order.day; oid=order.id
+    for name,(qty,amount) in row_contrib(order).items():
+        con.execute("INSERT INTO ventas_rollup(dia,producto,cantidad,importe) VALUES (?,?,?,?) "
+                    "ON CONFLICT(dia,producto) DO UPDATE SET cantidad=cantidad+excluded.cantidad, importe=importe+excluded.importe",
+                    (day,name,sign*qty,sign*amount))
+        if sign>0:
+            con.execute("INSERT OR IGNORE INTO ventas_tickets(dia,producto,order_id) VALUES (?,?,?)",(day,name,oid))
+        else:
+            con.execute("DELETE FROM ventas_tickets WHERE dia=? AND producto=? AND order_id=?",(day,name,oid))
+    if sign<0:
+        con.execute("DELETE FROM ventas_rollup WHERE dia=? AND cantidad<=0",(day,))
+
+def _rollup_rebuild(con:sqlite3.Connection):
+    con.execute("DELETE FROM ventas_rollup"); con.execute("DELETE FROM ventas_tickets")
+    for r in con.execute(_SELECT_ORDERS).fetchall():
+        _rollup_apply(con,_order(r),1)
+
+class SqliteEngine:
+    nombre="sqlite"
+
+    def __init__(self,path:str,fsync:bool=True):
+        self.path=path
+        self._lock=threading.RLock()
+        self.con=sqlite3.connect(path,timeout=30,isolation_level=None,check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        # FULL: cada COMMIT llega a disco; con grupo() varias operaciones comparten ese COMMIT.
+        self.con.execute("PRAGMA synchronous="+("FULL" if fsync else "NORMAL"))
+        self.con.executescript(SCHEMA)
+        if int(self._meta("esquema") or 1)<SCHEMA_VERSION:
+            self._transaction(self._migrar_esquema)
+        if self._meta("migrado_csv") is None:
+            migrar_csv_a_sqlite(self)
+        if self._meta("rollup") is None:
+            self._transaction(lambda: (_rollup_rebuild(self.con),self._set_meta("rollup","1")))
+
+    def _migrar_esquema(self):
+        cols={r[1] for r in self.con.execute("PRAGMA table_info(comandas)")}
+        for _,col,tipo in _NUEVAS_COLUMNAS:
+            if col not in cols: self.con.execute(f"ALTER TABLE comandas ADD COLUMN {col} {tipo}")
+        self._set_meta("esquema",SCHEMA_VERSION)
+
+    def _meta(self,clave:str)->Optional[str]:
+        r=self.con.execute("SELECT valor FROM meta WHERE clave=?",(clave,)).fetchone()
+        return r[0] if r else None
+
+    def _set_meta(self,clave:str,valor):
+        self.con.execute("INSERT OR REPLACE INTO meta(clave,valor) VALUES (?,?)",(clave,str(valor)))
+
+    def _bump_version(self):
+        self.con.execute("INSERT INTO meta(clave,valor) VALUES ('version','1') ON CONFLICT(clave) DO UPDATE SET valor=CAST(valor AS INTEGER)+1")
+
+    @contextmanager
+    def grupo(self):
+        with self._lock:
+            if self.con.in_transaction:
+                yield; return
+            self.con.execute("BEGIN IMMEDIATE")
+            # Igual que en CSV, lo que sí se escribió se confirma aunque una operación posterior falle;
+            # cada operación deshace lo suyo con su SAVEPOINT.
+            try: yield
+            finally: self.con.execute("COMMIT")
+
+    def _transaction(self,fn):
+        with self._lock:
+            if self.con.in_transaction:
+                self.con.execute("SAVEPOINT op")
+                try:
+                    res=fn()
+                    self.con.execute("RELEASE op")
+                except:
+                    self.con.execute("ROLLBACK TO op"); self.con.execute("RELEASE op"); raise
+                return res
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                res=fn()
+                self.con.execute("COMMIT")
+            except:
+                self.con.execute("ROLLBACK"); raise
+        return res
+
+    def _upsert_order(self,order:Order,nuevo:bool,expected_version:Optional[int]=None):
+        def run():
+            old=self.con.execute(_SELECT_ORDERS+" WHERE id=?",(order.id,)).fetchone()
+            cur=int(old[VERSION_COL] or 0) if old else None
+            if nuevo and old: raise OrderConflictError(order.id,cur)
+            if not nuevo and not old: raise OrderConflictError(order.id,None)
+            if expected_version is not None and cur!=expected_version: raise OrderConflictError(order.id,cur)
+            new=order.replace(version=(cur or 0)+1)
+            if old: _rollup_apply(self.con,_order(old),-1)
+            self.con.execute(_INSERT_ORDER,new.to_row())
+            _rollup_apply(self.con,new,1)
+            self._bump_version()
+        self._transaction(run)
+
+    def ensure(self):
+        pass
+
+    def read_orders(self)->List[List[str]]:
+        with self._lock:
+            rows=self.con.execute(_SELECT_ORDERS+" ORDER BY id").fetchall()
+        # En SQLite se cuentan las filas devueltas; los bytes leídos no se conocen desde Python.
+        contar(len(rows))
+        return [list(CSV_HEADER)]+[_row(r) for r in rows]
+
+    def all_orders(self)->List[Order]:
+        with self._lock:
+            rows=self.con.execute(_SELECT_ORDERS+" ORDER BY id").fetchall()
+        contar(len(rows))
+        return [_order(r) for r in rows]
+
+    def write_orders(self,all_rows:List[List[str]]):
+        def run():
+            self.con.execute("DELETE FROM comandas")
+            self.con.executemany(_INSERT_ORDER,[_fit_row(r) for r in all_rows[1:] if r])
+            _rollup_rebuild(self.con)
+            self._bump_version()
+        self._transaction(run)
+
+    def compact(self):
+        with self._lock:
+            self.con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def version(self)->int:
+        with self._lock:
+            return int(self._meta("version") or 0)
+
+    def get_order(self,order_id:int)->Optional[Order]:
+        with self._lock:
+            r=self.con.execute(_SELECT_ORDERS+" WHERE id=?",(order_id,)).fetchone()
+        return _order(r) if r else None
+
+    def orders_for_day(self,day:str,estado:Optional[str]=None)->List[Order]:
+        # "~" ordena después de " ", así el rango cubre todo "AAAA-MM-DD hh:mm:ss" del día.
+        sql=_SELECT_ORDERS+" WHERE fecha_hora>=? AND fecha_hora<?"; params=[day,day+"~"]
+        if estado is not None:
+            sql+=" AND estado=?"; params.append(estado)
+        with self._lock:
+            rows=self.con.execute(sql+" ORDER BY fecha_hora",params).fetchall()
+        contar(len(rows))
+        return [_order(r) for r in rows]
+
+    def ventas_por_producto(self,desde:Optional[str],hasta:Optional[str],excluir:Set[str]=frozenset())->List[Tuple[str,int,float,int]]:
+        where=" WHERE dia>=? AND dia<=?"; params=(desde or "",hasta or "~")
+        if excluir:
+            # Por día, para saltar los ya archivados; los tickets distintos de un rango son la suma por día.
+            with self._lock:
+                agg=self.con.execute("SELECT dia,producto,cantidad,importe FROM ventas_rollup"+where,params).fetchall()
+                tickets={(d,n):t for d,n,t in self.con.execute("SELECT dia,producto,COUNT(DISTINCT order_id) FROM ventas_tickets"+where+" GROUP BY dia,producto",params)}
+            acc={}
+            for d,n,q,a in agg:
+                if d in excluir: continue
+                c=acc.setdefault(n,[0,0.0,0])
+                c[0]+=q; c[1]+=a; c[2]+=tickets.get((d,n),0)
+            return [(n,int(c[0]),round(c[1],2),c[2]) for n,c in acc.items() if c[0]>0]
+        with self._lock:
+            agg=self.con.execute("SELECT producto,SUM(cantidad),SUM(importe) FROM ventas_rollup"+where+" GROUP BY producto",params).fetchall()
+            tickets=dict(self.con.execute("SELECT producto,COUNT(DISTINCT order_id) FROM ventas_tickets"+where+" GROUP BY producto",params).fetchall())
+        return [(n,int(q),round(a,2),tickets.get(n,0)) for n,q,a in agg if q>0]
+
+    def append_order(self,order:Order):
+        self._upsert_order(order,True)
+
+    def update_order(self,order:Order,expected_version:Optional[int]=None):
+        self._upsert_order(order,False,expected_version)
+
+    def set_order_status(self,order_id:int,status:str,expected_version:Optional[int]=None):
+        def run():
+            r=self.con.execute("SELECT version FROM comandas WHERE id=?",(order_id,)).fetchone()
+            if r is None: raise OrderConflictError(order_id,None)
+            if expected_version is not None and (r[0] or 0)!=expected_version: raise OrderConflictError(order_id,r[0] or 0)
+            self.con.execute("UPDATE comandas SET estado=?, version=version+1 WHERE id=?",(status,order_id))
+            self._bump_version()
+        self._transaction(run)
+
+    def dias_activos(self)->Set[str]:
+        with self._lock:
+            return {r[0] for r in self.con.execute("SELECT DISTINCT substr(fecha_hora,1,10) FROM comandas")}
+
+    def archivar(self,antes:str,forzados:Set[str],guardar)->int:
+        def run():
+            hasta=max([antes]+[d+"~" for d in forzados])
+            rows=self.con.execute(_SELECT_ORDERS+" WHERE fecha_hora<?",(hasta,)).fetchall()
+            dias=dias_archivables([_order(r) for r in rows],antes,forzados)
+            orders=[o for os_ in dias.values() for o in os_]
+            if not orders: return 0
+            # El manifiesto se escribe antes del COMMIT; si algo falla después, el arranque termina de mover los días.
+            guardar(orders)
+            self.con.executemany("DELETE FROM comandas WHERE id=?",[(o.id,) for o in orders])
+            # Se archivan días completos: su acumulado de ventas sale entero.
+            self.con.executemany("DELETE FROM ventas_rollup WHERE dia=?",[(d,) for d in dias])
+            self.con.executemany("DELETE FROM ventas_tickets WHERE dia=?",[(d,) for d in dias])
+            self._bump_version()
+            return len(orders)
+        return self._transaction(run)
+
+    def next_order_id(self,minimo:int=0)->int:
+        def run():
+            last=int(self._meta("seq") or 0)
+            top=self.con.execute("SELECT MAX(id) FROM comandas").fetchone()[0] or 0
+            nxt=max(last,top,minimo)+1
+            self._set_meta("seq",nxt)
+            return nxt
+        return self._transaction(run)
+
+    def _saldo(self)->float:
+        r=self.con.execute("SELECT saldo FROM caja ORDER BY seq DESC LIMIT 1").fetchone()
+        try: return float(r[0]) if r else 0.0
+        except: return 0.0
+
+    def guardar_pedido(self,order:Order,movs:List[Tuple[str,float,float,str]],nuevo:bool,expected_version:Optional[int]=None,minimo:int=0)->int:
+        def run():
+            o=order.replace(id=self.next_order_id(minimo)) if nuevo else order
+            self._upsert_order(o,nuevo,expected_version)
+            ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S"); saldo=self._saldo(); filas=[]
+            for tipo,ingreso_ef,egreso_ef,nota in movs:
+                saldo=round(saldo+ingreso_ef-egreso_ef,2)
+                filas.append((ts,tipo,str(o.id),f"{ingreso_ef:.2f}",f"{egreso_ef:.2f}",nota,f"{saldo:.2f}"))
+            self.con.executemany(_INSERT_CAJA,filas)
+            return o.id
+        return self._transaction(run)
+
+    def caja_registrar(self,tipo:str,order_id:str,ingreso_ef:float,egreso_ef:float,nota:str):
+        def run():
+            saldo=self._saldo()+ingreso_ef-egreso_ef
+            self.con.execute(_INSERT_CAJA,(datetime.now().strftime("%Y-%m-%d %H:%M:%S"),tipo,order_id,f"{ingreso_ef:.2f}",f"{egreso_ef:.2f}",nota,f"{saldo:.2f}"))
+        self._transaction(run)
+
+    def caja_saldo(self)->float:
+        with self._lock:
+            return self._saldo()
+
+    def caja_recalcular(self)->float:
+        with self._lock:
+            r=self.con.execute("SELECT SUM(CAST(ingreso AS REAL)-CAST(egreso AS REAL)) FROM caja").fetchone()
+        return round(r[0] or 0.0,2)
+
+    def caja_movimientos_dia(self,fecha:str)->List[List[str]]:
+        with self._lock:
+            rows=self.con.execute("SELECT "+",".join(CAJA_COLS)+" FROM caja WHERE ts>=? AND ts<? ORDER BY seq",(fecha,fecha+"~")).fetchall()
+        contar(len(rows))
+        return [_row(r) for r in rows]
+
+    def caja_tiene_movimiento(self,fecha:str,tipo:str)->bool:
+        with self._lock:
+            return self.con.execute("SELECT 1 FROM caja WHERE tipo=? AND ts>=? AND ts<? LIMIT 1",(tipo,fecha,fecha+"~")).fetchone() is not None
+
+def migrar_csv_a_sqlite(engine:SqliteEngine):
+    orders=CsvEngine().read_orders()[1:] if os.path.exists(CSV_FILE) or os.path.exists(JOURNAL_FILE) else []
+    caja=[]
+    if os.path.exists(CAJA_FILE):
+        with open(CAJA_FILE,"r",newline="",encoding="utf-8") as f:
+            caja=[r for r in list(csv.reader(f))[1:] if len(r)>=len(CAJA_COLS)]
+    with engine._lock:
+        con=engine.con
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.executemany(_INSERT_ORDER,[r for r in orders if r and r[0].strip().isdigit()])
+            con.executemany(_INSERT_CAJA,[r[:len(CAJA_COLS)] for r in caja])
+            _rollup_rebuild(con); engine._set_meta("rollup","1")
+            engine._set_meta("migrado_csv",datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            engine._bump_version()
+            con.execute("COMMIT")
+        except:
+            con.execute("ROLLBACK"); raise
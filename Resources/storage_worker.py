@@ -0,0 +1,55 @@
+from __future__ import annotations
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from PyQt6 import sip
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtWidgets import QMessageBox, QWidget
+
+class StorageWorker(QObject):
+    _done=pyqtSignal(object)
+    busy_changed=pyqtSignal(bool)
+
+    def __init__(self):
+        super().__init__()
+        self._thread_id:Optional[int]=None
+        # Un solo hilo: lecturas y escrituras se ejecutan en el orden en que se encolan.
+        self._pool=ThreadPoolExecutor(max_workers=1,thread_name_prefix="storage",initializer=self._mark_thread)
+        self._pending=0
+        self._done.connect(self._deliver)
+
+    def _mark_thread(self):
+        self._thread_id=threading.get_ident()
+
+    def submit(self,fn:Callable,*args,callback:Optional[Callable]=None,owner:Optional[QObject]=None)->Future:
+        self._pending+=1
+        if self._pending==1: self.busy_changed.emit(True)
+        fut=self._pool.submit(fn,*args)
+        fut.add_done_callback(lambda f: self._done.emit((f,callback,owner)))
+        return fut
+
+    def call(self,fn:Callable,*args):
+        if threading.get_ident()==self._thread_id: return fn(*args)
+        return self._pool.submit(fn,*args).result()
+
+    def drain(self):
+        self._pool.submit(lambda: None).result()
+
+    def _deliver(self,item):
+        fut,callback,owner=item
+        self._pending-=1
+        if self._pending==0: self.busy_changed.emit(False)
+        if owner is not None and sip.isdeleted(owner): return
+        exc=fut.exception()
+        if exc is not None:
+            QMessageBox.critical(owner if isinstance(owner,QWidget) else None,"Error",f"Error de almacenamiento: {exc}")
+            return
+        if callback is not None: callback(fut.result())
+
+_WORKER:Optional[StorageWorker]=None
+
+def storage_worker()->StorageWorker:
+    global _WORKER
+    if _WORKER is None: _WORKER=StorageWorker()
+    return _WORKER
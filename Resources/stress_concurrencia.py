@@ -0,0 +1,111 @@
+"""Prueba de estrés: varias estaciones actualizando el mismo pedido a la vez.
+
+Cada proceso hace lectura-modificación-escritura con control de versión y
+reintenta cuando otra estación ganó la carrera. Cada actualización lleva su
+movimiento de caja en la misma transacción. Al final el total del pedido y el
+saldo de caja deben ser exactamente procesos x incrementos (ninguna
+actualización perdida ni movimiento de un intento rechazado) y los IDs
+asignados en paralelo no deben repetirse.
+
+Con --journal-max (bytes, solo csv) el journal se compacta mucho antes de lo
+normal, así la compactación también corre mientras las demás estaciones escriben.
+Con --lectores (solo csv) otras estaciones cargan el historial desde cero sin
+candado y compactan con lo que leyeron: una carga que mezcle un CSV viejo con
+un journal nuevo devolvería filas viejas al CSV y se verían actualizaciones perdidas.
+
+--historial agrega pedidos viejos para que cada carga tarde lo que tarda en una caja real.
+
+Uso: python stress_concurrencia.py [--procesos 6] [--incrementos 50] [--motor csv|sqlite] [--journal-max 4096] [--lectores 2] [--historial 500]
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+def _estacion(carpeta:str,incrementos:int,journal_max:int,cola):
+    os.chdir(carpeta)
+    import storage
+    if journal_max: storage.JOURNAL_MAX_BYTES=journal_max
+    from storage import get_order, guardar_pedido, next_order_id, OrderConflictError
+    conflictos=0; ids=[]
+    for _ in range(incrementos):
+        while True:
+            o=get_order(1)
+            try:
+                guardar_pedido(o.replace(total=o.total+100),[("AJUSTE_COBRO",1.0,0.0,"estrés")],o.version); break
+            except OrderConflictError:
+                conflictos+=1
+        ids.append(next_order_id())
+    cola.put((conflictos,ids))
+
+def _lector(carpeta:str,journal_max:int,fin,cola):
+    os.chdir(carpeta)
+    import storage
+    if journal_max: storage.JOURNAL_MAX_BYTES=journal_max
+    cargas=0
+    while not fin.is_set():
+        st=storage.OrderStore(); st.get(1); st.compact(); cargas+=1
+    cola.put(cargas)
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument("--procesos",type=int,default=6)
+    ap.add_argument("--incrementos",type=int,default=50)
+    ap.add_argument("--motor",choices=("csv","sqlite"),default="csv")
+    ap.add_argument("--journal-max",type=int,default=0,help="bytes del journal antes de compactar (csv)")
+    ap.add_argument("--lectores",type=int,default=2,help="estaciones que cargan desde cero y compactan (csv)")
+    ap.add_argument("--historial",type=int,default=500,help="pedidos viejos además del pedido 1")
+    args=ap.parse_args()
+    origen=os.getcwd(); carpeta=tempfile.mkdtemp(prefix="stress_")
+    try:
+        return _correr(args,carpeta)
+    finally:
+        os.chdir(origen); shutil.rmtree(carpeta,ignore_errors=True)
+
+def _correr(args,carpeta:str)->int:
+    os.chdir(carpeta)
+    with open("config_caja.json","w",encoding="utf-8") as f:
+        json.dump({"almacenamiento":args.motor},f)
+    from storage import ensure_storage, write_orders, get_order, Order, parse_ts, CSV_HEADER
+    ensure_storage()
+    ts=parse_ts("2024-01-01 12:00:00")
+    write_orders([list(CSV_HEADER)]+[Order(i,"1",(),0 if i==1 else 1000,ts).to_row() for i in range(1,args.historial+2)])
+    cola=mp.Queue(); cola_lect=mp.Queue(); fin=mp.Event()
+    lectores=args.lectores if args.motor=="csv" else 0
+    t0=time.perf_counter()
+    procs=[mp.Process(target=_estacion,args=(carpeta,args.incrementos,args.journal_max,cola)) for _ in range(args.procesos)]
+    lects=[mp.Process(target=_lector,args=(carpeta,args.journal_max,fin,cola_lect)) for _ in range(lectores)]
+    for p in procs+lects: p.start()
+    res=[cola.get() for _ in procs]
+    fin.set()
+    cargas=sum(cola_lect.get() for _ in lects)
+    for p in procs+lects: p.join()
+    seg=time.perf_counter()-t0
+    from storage import order_store, caja_saldo_actual
+    if args.motor=="csv": order_store().sync()
+    final=get_order(1); saldo=caja_saldo_actual()
+    esperado=args.procesos*args.incrementos
+    ids=[i for _,l in res for i in l]
+    out={
+        "motor":args.motor,"procesos":args.procesos,"incrementos":args.incrementos,
+        "journal_max":args.journal_max or None,
+        "total_esperado":esperado,"total_final":final.total/100,"version_final":final.version,
+        "actualizaciones_perdidas":esperado-final.total//100,
+        "caja_descuadre":round(saldo-esperado,2),
+        "conflictos_reintentados":sum(c for c,_ in res),
+        "ids_duplicados":len(ids)-len(set(ids)),
+        "cargas_en_frio":cargas,
+        "segundos":round(seg,3),
+    }
+    print(json.dumps(out,ensure_ascii=False,indent=2))
+    return 0 if out["actualizaciones_perdidas"]==0 and out["caja_descuadre"]==0 and out["ids_duplicados"]==0 else 1
+
+if __name__=="__main__":
+    sys.exit(main())
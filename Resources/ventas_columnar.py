@@ -0,0 +1,62 @@
+from __future__ import annotations
+from datetime import date
+from typing import List, Optional, Tuple, Dict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from storage import Order, all_orders, orders_version
+
+class ColumnarSales:
+    def __init__(self):
+        self.version=None
+        self.names:List[str]=[]
+        self.codes:Dict[str,int]={}
+
+    def load(self,orders:List[Order]):
+        self.names=[]; self.codes={}
+        item_order=[]; item_code=[]; item_qty=[]; item_amount=[]; item_first=[]
+        for i,o in enumerate(orders):
+            seen=set()
+            for it in o.items:
+                code=self.codes.get(it.name)
+                if code is None:
+                    code=self.codes[it.name]=len(self.names); self.names.append(it.name)
+                item_order.append(i); item_code.append(code); item_qty.append(it.qty); item_amount.append(it.qty*it.price)
+                # Primera aparición del producto en el ticket: cuenta para "tickets distintos".
+                item_first.append(code not in seen); seen.add(code)
+        # Las fechas ya vienen interpretadas; None (fecha ilegible) queda como NaT.
+        self.order_ts=np.array([o.fecha for o in orders],dtype="datetime64[s]")
+        order_idx=np.array(item_order,dtype=np.int64)
+        self.item_day=self.order_ts[order_idx].astype("datetime64[D]")
+        self.item_code=np.array(item_code,dtype=np.int32)
+        self.item_qty=np.array(item_qty,dtype=np.float64)
+        self.item_amount=np.array(item_amount,dtype=np.float64)
+        self.item_first=np.array(item_first,dtype=bool)
+
+    def refresh(self):
+        v=orders_version()
+        if v!=self.version:
+            self.load(all_orders()); self.version=v
+
+    def query(self,desde:Optional[date]=None,hasta:Optional[date]=None)->List[Tuple[str,int,float,int]]:
+        self.refresh()
+        mask=~np.isnat(self.item_day)
+        if desde is not None: mask&=self.item_day>=np.datetime64(desde,"D")
+        if hasta is not None: mask&=self.item_day<=np.datetime64(hasta,"D")
+        n=len(self.names)
+        codes=self.item_code[mask]
+        qty=np.bincount(codes,weights=self.item_qty[mask],minlength=n)
+        amount=np.bincount(codes,weights=self.item_amount[mask],minlength=n)
+        tcount=np.bincount(self.item_code[mask&self.item_first],minlength=n)
+        return [(self.names[c],int(qty[c]),round(float(amount[c]),2),int(tcount[c])) for c in np.flatnonzero(qty)]
+
+_COLUMNAR:Optional[ColumnarSales]=None
+
+def columnar_sales()->Optional[ColumnarSales]:
+    global _COLUMNAR
+    if np is None: return None
+    if _COLUMNAR is None: _COLUMNAR=ColumnarSales()
+    return _COLUMNAR